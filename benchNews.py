@@ -0,0 +1,258 @@
+# -*- utf-8 -*-
+"""
+解析性能基准
+使用录制好的列表页/详情页，离线执行各站点的 getNeswIndex / getNewsDetails，统计解析速度和内存
+
+python3 benchNews.py record                     # 从线上录制页面到 benchFixtures
+python3 benchNews.py run --out new.json         # 运行基准并保存结果
+python3 benchNews.py compare old.json new.json  # 对比两次结果
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tracemalloc
+
+import runNews
+
+# 配置
+CONFIG = {
+    # 录制页面存放目录
+    'fixtureDir': './benchFixtures',
+    # 每个站点录制的详情页数量
+    'recordDetails': 5,
+    # 每个站点重复执行次数，取最快一次
+    'repeat': 5,
+    # 对比时文章处理速度下降超过该比例视为退化
+    'threshold': 0.1,
+}
+
+
+# 录制清单路径
+def manifestPath():
+    """
+    :return:
+    """
+    return os.path.join(CONFIG.get('fixtureDir'), 'manifest.json')
+
+
+# 读取录制清单
+def loadManifest():
+    """
+    :return:    站点名称 -> {'index': {'url', 'file'}, 'details': [{'url', 'file'}]}
+    """
+
+    with open(manifestPath(), 'r') as f:
+        return json.load(f)
+
+
+# 读取录制的页面
+def readFixture(item: dict):
+    """
+    :param item:    清单中的页面信息
+    :return:
+    """
+
+    with open(os.path.join(CONFIG.get('fixtureDir'), item['file']), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+# 写入录制的页面
+def writeFixture(file: str, source: str):
+    """
+    :param file:    相对 fixtureDir 的文件路径
+    :param source:  页面源码
+    :return:
+    """
+
+    path = os.path.join(CONFIG.get('fixtureDir'), file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(source)
+
+
+# 录制页面
+def record():
+    """
+    :return:
+    """
+
+    manifest = {}
+    for cls in runNews.SITE.registry:
+        site = cls()
+        name = cls.__name__
+
+        # 列表页
+        url = site.indexUrl(page=0)
+        source = runNews.doGET(url=url, headers=site.headers)
+        file = '%s/index.%s' % (name, 'json' if site.indexType == 'json' else 'html')
+        writeFixture(file=file, source=source)
+        manifest[name] = {'index': {'url': url, 'file': file}, 'details': []}
+
+        # 详情页
+        entries = [entry for entry in site.parseIndex(source=source, page=0) if site.accept(entry)]
+        for i, entry in enumerate(entries[:CONFIG.get('recordDetails')]):
+            file = '%s/detail-%d.html' % (name, i + 1)
+            writeFixture(file=file, source=runNews.doGET(url=entry['source_url'], headers=site.headers))
+            manifest[name]['details'].append({'url': entry['source_url'], 'file': file})
+
+        print(name, '已录制列表页及 [ %d ] 个详情页' % len(manifest[name]['details']))
+
+    with open(manifestPath(), 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+# 离线请求：按url返回录制的页面
+def offline(manifest: dict):
+    """
+    :param manifest:    录制清单
+    :return:
+    """
+
+    pages = {}
+    for site in manifest.values():
+        for item in [site['index']] + site['details']:
+            pages[item['url']] = readFixture(item)
+
+    def doGET(url: str, headers: dict = None, urlType: str = None):
+        return pages[url]
+
+    def cacheGET(url: str, headers: dict = None):
+        return pages[url]
+
+    # 替换网络请求，列表缓存始终视为有变化
+    runNews.doGET = doGET
+    runNews.HTTPCACHE.get = staticmethod(cacheGET)
+
+
+# 单个站点执行一次
+def benchSite(site: runNews.SITE, recorded: set):
+    """
+    :param site:        站点适配器
+    :param recorded:    已录制详情页的url
+    :return:            (列表耗时, 详情耗时, 文章数)
+    """
+
+    beginTime = time.perf_counter()
+    entries = [entry for entry in site.getNeswIndex(page=0) if site.accept(entry)]
+    indexTime = time.perf_counter() - beginTime
+
+    # 只处理已录制的详情页
+    entries = [entry for entry in entries if entry['source_url'] in recorded]
+
+    beginTime = time.perf_counter()
+    for entry in entries:
+        site.getNewsDetails(entry=entry)
+    detailTime = time.perf_counter() - beginTime
+
+    return indexTime, detailTime, len(entries)
+
+
+# 运行基准
+def run(out: str = None):
+    """
+    :param out:     结果保存路径
+    :return:
+    """
+
+    manifest = loadManifest()
+    offline(manifest)
+
+    results = {
+        'parser': runNews.CONFIG.get('htmlParser'),
+        'repeat': CONFIG.get('repeat'),
+        'sites': {},
+    }
+
+    print('%-8s %8s %12s %12s %14s %12s %10s' % ('site', 'articles', 'index(ms)', 'details(ms)',
+                                               'article(ms)', 'articles/s', 'peak(KB)'))
+    for name, item in manifest.items():
+        site = getattr(runNews, name)()
+        recorded = set(detail['url'] for detail in item['details'])
+
+        # 多次执行取最快一次，减少抖动
+        runs = [benchSite(site=site, recorded=recorded) for i in range(CONFIG.get('repeat'))]
+        indexTime = min(r[0] for r in runs)
+        detailTime = min(r[1] for r in runs)
+        articles = runs[0][2]
+
+        # 单独执行一次统计峰值内存，避免影响计时
+        tracemalloc.start()
+        benchSite(site=site, recorded=recorded)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results['sites'][name] = {
+            'articles': articles,
+            'indexMs': indexTime * 1000,
+            'detailsMs': detailTime * 1000,
+            'articleMs': detailTime * 1000 / articles if articles else 0,
+            'articlesPerSec': articles / detailTime if detailTime else 0,
+            'peakKB': peak / 1024,
+        }
+        r = results['sites'][name]
+        print('%-8s %8d %12.2f %12.2f %14.2f %12.1f %10.1f' % (name, r['articles'], r['indexMs'], r['detailsMs'],
+                                                                r['articleMs'], r['articlesPerSec'], r['peakKB']))
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+# 对比两次结果
+def compare(old: str, new: str):
+    """
+    :param old:     基准结果
+    :param new:     本次结果
+    :return:        是否存在性能退化
+    """
+
+    with open(old, 'r') as f:
+        old = json.load(f)
+    with open(new, 'r') as f:
+        new = json.load(f)
+
+    regressed = False
+    print('%-8s %-16s %12s %12s %9s' % ('site', 'metric', 'old', 'new', 'change'))
+    for name, result in new['sites'].items():
+        if name not in old['sites']:
+            continue
+        for metric in ['indexMs', 'detailsMs', 'articlesPerSec', 'peakKB']:
+            before, after = old['sites'][name][metric], result[metric]
+            change = (after - before) / before if before else 0
+            print('%-8s %-16s %12.2f %12.2f %+8.1f%%' % (name, metric, before, after, change * 100))
+
+        # 文章处理速度下降超过阈值
+        before = old['sites'][name]['articlesPerSec']
+        if before and (before - result['articlesPerSec']) / before > CONFIG.get('threshold'):
+            print('%-8s 文章处理速度下降超过 %d%%' % (name, CONFIG.get('threshold') * 100))
+            regressed = True
+
+    return regressed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='解析性能基准')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('record', help='从线上录制页面')
+    runParser = sub.add_parser('run', help='运行基准')
+    runParser.add_argument('--out', help='结果保存路径')
+    runParser.add_argument('--repeat', type=int, default=CONFIG.get('repeat'), help='重复次数')
+    compareParser = sub.add_parser('compare', help='对比两次结果')
+    compareParser.add_argument('old')
+    compareParser.add_argument('new')
+    compareParser.add_argument('--threshold', type=float, default=CONFIG.get('threshold'), help='允许的速度下降比例')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record()
+    elif args.command == 'run':
+        CONFIG['repeat'] = args.repeat
+        run(out=args.out)
+    else:
+        CONFIG['threshold'] = args.threshold
+        sys.exit(1 if compare(old=args.old, new=args.new) else 0)
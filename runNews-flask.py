@@ -1,18 +1,35 @@
 # -*- utf-8 -*-
 
+import os
 import time
 import datetime
 import requests
 import re
 import json
+import html
+import gzip
+import hashlib
 import functools
-from bs4 import BeautifulSoup
+import threading
+import queue
+from collections import OrderedDict
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4 import FeatureNotFound
 import pymysql
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import flask
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+# brotli 压缩（可选），未安装时只使用 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # 配置
 CONFIG = {
     # 代理
@@ -25,12 +42,53 @@ CONFIG = {
     'imgUrl': '/statics',
     # 定时任务
     'cron': '*/5 * * * *',
+    # HTML解析器: lxml（推荐，需安装lxml）或 html.parser（纯python，较慢）
+    'htmlParser': 'lxml',
+
+    # 接口响应缓存：最多缓存多少个响应，每个响应最长缓存多少秒
+    'cacheSize': 256,
+    'cacheTTL': 60,
+    # 每隔多少秒检查一次数据版本号，版本变化（抓取写入新数据）时清空缓存
+    'cacheVersionCheck': 1,
+    # 导出接口每次从服务端游标读取多少行
+    'exportBatch': 500,
+    # 响应超过多少字节时压缩（客户端支持时优先 brotli，其次 gzip）
+    'compressMinSize': 500,
+    'gzipLevel': 6,
+    'brotliQuality': 5,
+
+    # 失败重试：每隔多少秒检查一次，每次最多重试多少条
+    'retryInterval': 300,
+    'retryBatch': 50,
+    # 第一次重试等待多少秒，之后每次翻倍，最长等待多少秒，最多重试多少次
+    'retryBase': 300,
+    'retryMax': 86400,
+    'retryAttempts': 8,
 
     # 网络请求重试次数
     'retry': 3,
-    # 反爬拦截之后等待时间（单位s）
+    # 连接超时、读取超时（单位s），每篇文章从开始请求到写入前最多多少秒
+    'connectTimeout': 5,
+    'readTimeout': 20,
+    'articleDeadline': 60,
+    # 反爬拦截之后等待时间（单位s），响应没有 Retry-After 时使用
     'wait': 2,
 
+    # 按域名自适应限速：初始每秒请求数，未单独配置的域名使用default
+    'rateLimit': {
+        'default': 4,
+        'theedgemalaysia.com': 4,
+    },
+    # 速率上下限，正常响应约每秒加速多少，被限流时乘以多少，最多累积多少个令牌
+    'rateMin': 0.2,
+    'rateMax': 20,
+    'rateIncrease': 0.5,
+    'rateDecrease': 0.5,
+    'rateBurst': 4,
+    # 视为限流的状态码，Retry-After 最多等待多少秒
+    'throttleStatus': [403, 429, 503],
+    'retryAfterMax': 300,
+
     # 抓取日志，分割flask日志，方便排查问题
     'logFile': 'spider.log',
     # 是否在屏幕同时打印抓取日志，True是，False否
@@ -42,8 +100,94 @@ CONFIG = {
     'mysqlDB': 'SRK',
     'mysqlUser': 'root',
     'mysqlPassword': 'Devops-Db;2021',
+
+    # mysql连接池：最大连接数，无可用连接时最多等待多少秒，空闲超过多少秒的连接复用前先检查
+    'mysqlPoolSize': 8,
+    'mysqlPoolTimeout': 10,
+    'mysqlPoolCheck': 30,
 }
 
+# 文章详情主体，模块加载时编译一次
+newsBodyPattern = re.compile(r'news-detail_newsTextDataWrap')
+newsBodyStrainer = SoupStrainer('div', attrs={'class': newsBodyPattern})
+
+# 反爬拦截页面（部分站点拦截时返回200）
+antiBotPattern = re.compile(r'cf-browser-verification|challenge-platform|Attention Required! \| Cloudflare|'
+                            r'<title>\s*(Access Denied|Just a moment\.\.\.)\s*</title>', re.I)
+
+# 接口字段 -> news 表字段
+newsFields = OrderedDict([
+    ('id', 'id'),
+    ('nid', 'nid'),
+    ('title', 'title'),
+    ('abstract', 'sub_title'),
+    ('img', 'img'),
+    ('content', 'content'),
+    ('lang', 'lang'),
+    ('source_url', 'source_url'),
+    ('created', 'created'),
+])
+# 列表模式默认返回的字段，不含正文
+listFields = ['id', 'nid', 'title', 'abstract', 'img', 'lang', 'source_url', 'created']
+
+# 分页游标，格式为 created,id
+cursorPattern = re.compile(r'^(\d+(?:\.\d+)?),(\d+)$')
+
+# 数据库迁移，启动时依次执行，每条语句只执行一次，已存在的索引/表会被忽略
+MIGRATIONS = [
+    # 游标分页按 (created, id) 定位
+    'create index idx_news_created_id on news (created, id)',
+    # 新闻详情按 nid 查询
+    'create index idx_news_nid on news (nid)',
+    # 新闻详情按源地址查询（印度站点的新闻没有 nid）
+    'create index idx_news_source_url on news (source_url)',
+    # 数据版本号，新闻写入后递增，API据此失效响应缓存
+    'create table newsVersion (id tinyint primary key, version bigint not null default 0)',
+    'insert ignore into newsVersion (id, version) values (1, 0)',
+    # 交易所/站点标识，flask版本只抓马来西亚
+    "alter table news add column exchange varchar(16) not null default 'ml'",
+    # 新闻计数，按 交易所/站点 + 语言 在写入时累加，代替 count(id) 全表扫描
+    'create table newsCounter (exchange varchar(16) not null, lang varchar(16) not null, '
+    'total bigint not null default 0, primary key (exchange, lang))',
+    # 首次创建时按已有数据初始化，之后已存在的计数不会被覆盖
+    "insert ignore into newsCounter (exchange, lang, total) "
+    "select ifnull(exchange, ''), ifnull(lang, ''), count(*) from news group by ifnull(exchange, ''), ifnull(lang, '')",
+    # 新闻筛选：按站点/语言筛选后按时间倒序分页，标题前缀匹配
+    'create index idx_news_exchange_created on news (exchange, created, id)',
+    'create index idx_news_lang_created on news (lang, created, id)',
+    'create index idx_news_title on news (title(32))',
+    # 全文检索：标题、摘要及去掉HTML标签的正文单独存放，ngram 分词同时支持中文、印地语、古吉拉特语和英文
+    'create table newsText (id bigint primary key, title text, sub_title text, content mediumtext) '
+    'engine=InnoDB default charset=utf8mb4',
+    "insert ignore into newsText (id, title, sub_title, content) "
+    "select id, title, sub_title, regexp_replace(content, '<[^>]*>', ' ') from news",
+    'create fulltext index ft_newsText on newsText (title, sub_title, content) with parser ngram',
+    # 各来源抓取进度：已衔接上的最新新闻、未完成的翻页位置、上次抓取时间，与新闻写入在同一事务中推进
+    'create table crawlState (source varchar(32) primary key, last_nid varchar(64), last_created double, '
+    'walk_cursor varchar(255), last_pass double)',
+    # 本程序单独记录进度（发布时间为毫秒），由本程序写入的最新新闻（带 nid）初始化，代替 spiderLimit
+    "insert ignore into crawlState (source, last_nid, last_created) "
+    "select 'COLLECT', nid, created from news where exchange = 'ml' and nid is not null and nid <> '' "
+    "order by created desc, id desc limit 1",
+    # 失败的新闻/图片：错误类型、重试次数、下次重试时间（为空时不再重试），由定时任务按指数退避重试
+    'create table newsRetry (source_url varchar(255) not null, kind varchar(8) not null, source varchar(32) not null, '
+    'entry text, error_class varchar(64), error text, attempts int not null default 0, next_attempt double, '
+    'created double, primary key (source_url, kind), key idx_next_attempt (next_attempt))',
+]
+
+
+# HTML标签
+htmlTagPattern = re.compile(r'<[^>]*>')
+
+
+# 去掉HTML标签，用于全文检索
+def plainText(source: str):
+    """
+    :param source:  HTML
+    :return:
+    """
+    return html.unescape(htmlTagPattern.sub(' ', source or ''))
+
 
 # Flask API
 api = flask.Flask(__name__)
@@ -98,6 +242,159 @@ def generalTryCatch(func):
     return wrapper
 
 
+# 接口响应缓存
+class CACHE(object):
+    """
+    进程内 LRU + TTL 缓存，按 接口路径 + 参数 缓存响应
+    抓取进程写入数据后递增 newsVersion，版本变化时整体失效
+    """
+
+    # 缓存条目: key -> (过期时间, 响应)
+    entries = OrderedDict()
+    lock = threading.Lock()
+    # 当前数据版本号、该版本首次出现的时间及上次检查时间
+    version = None
+    versionTime = 0
+    checkTime = 0
+
+    # 检查数据版本号，变化时清空缓存
+    @classmethod
+    def check(cls):
+        """
+        :return:
+        """
+
+        if time.time() - cls.checkTime < CONFIG.get('cacheVersionCheck'):
+            return
+
+        with DB() as db:
+            result = db.queryDB(sql='select version from newsVersion where id = 1')
+
+        with cls.lock:
+            cls.checkTime = time.time()
+            # 查询失败时清空，避免长期返回旧数据
+            version = result[0][0] if result else None
+            if version is None or version != cls.version:
+                cls.entries.clear()
+                cls.versionTime = time.time()
+            cls.version = version
+
+    # 读取缓存
+    @classmethod
+    def get(cls, key: tuple):
+        """
+        :param key:     缓存键
+        :return:        未命中或已过期时返回None
+        """
+
+        cls.check()
+
+        with cls.lock:
+            item = cls.entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del cls.entries[key]
+                return None
+            cls.entries.move_to_end(key)
+            return item[1]
+
+    # 写入缓存
+    @classmethod
+    def set(cls, key: tuple, value: dict, version):
+        """
+        :param key:     缓存键
+        :param value:   响应数据
+        :param version: 生成响应前的数据版本号，期间版本已变化则不缓存
+        :return:
+        """
+
+        with cls.lock:
+            if version is None or version != cls.version:
+                return
+            cls.entries[key] = (time.time() + CONFIG.get('cacheTTL'), value)
+            cls.entries.move_to_end(key)
+            while len(cls.entries) > CONFIG.get('cacheSize'):
+                cls.entries.popitem(last=False)
+
+
+# 响应缓存，装饰器
+def cached(func):
+    """
+    缓存装饰器，只缓存成功的响应
+    :param func:    传入具体的函数名称以装饰该函数
+    :return:
+    """
+
+    # 保留被装饰函数原始元数据
+    @functools.wraps(func)
+    # 装饰函数
+    def wrapper(*args, **kwargs):
+
+        # 接口路径 + 排序后的参数
+        key = (flask.request.path, tuple(sorted(flask.request.args.items(multi=True))))
+        result = CACHE.get(key)
+        version, versionTime = CACHE.version, CACHE.versionTime
+
+        # 未命中则执行实际函数
+        if result is None:
+            result = func(*args, **kwargs)
+            if result.get('code') != 8200:
+                return result
+            CACHE.set(key, result, version)
+
+        # 版本已知时，同一版本同一请求的数据相同，可用于 ETag
+        # 只由数据库版本号和请求生成，与处理请求的进程无关
+        if version is None:
+            return result
+        flask.g.etag = hashlib.sha1(('%s|%s' % (version, key)).encode('utf-8')).hexdigest()
+
+        # 返回时间取本进程见到该数据版本的时间，同一进程内内容不变
+        return dict(result, timestamp=versionTime)
+    # 返回装饰函数
+    return wrapper
+
+
+# 响应压缩及 ETag
+@api.after_request
+def compress(res):
+    """
+    :param res:     flask 响应对象
+    :return:
+    """
+
+    if res.status_code != 200 or res.direct_passthrough or 'Content-Encoding' in res.headers:
+        return res
+
+    # 按客户端支持选择压缩方式
+    accept = flask.request.accept_encodings
+    encoding = None
+    if res.content_length is not None and res.content_length >= CONFIG.get('compressMinSize'):
+        if brotli is not None and accept['br']:
+            encoding = 'br'
+        elif accept['gzip']:
+            encoding = 'gzip'
+    res.vary.add('Accept-Encoding')
+
+    # 弱 ETag：多进程部署时各进程的 timestamp 不同、压缩方式不同，字节不完全一致但数据相同
+    etag = flask.g.get('etag')
+    if etag is not None:
+        res.set_etag(etag, weak=True)
+        res.make_conditional(flask.request)
+        if res.status_code == 304:
+            return res
+
+    # 压缩
+    if encoding == 'br':
+        res.set_data(brotli.compress(res.get_data(), quality=CONFIG.get('brotliQuality')))
+    elif encoding == 'gzip':
+        res.set_data(gzip.compress(res.get_data(), compresslevel=CONFIG.get('gzipLevel')))
+    if encoding is not None:
+        res.headers['Content-Encoding'] = encoding
+
+    return res
+
+
 # 返回框架
 def response(code=8200, **kwargs):
     """
@@ -118,28 +415,300 @@ def response(code=8200, **kwargs):
     return data
 
 
-# 数据库操作类
-class DB(object):
+# 网络请求失败
+class FETCHERROR(Exception):
     """
-    数据库操作类
+    网络请求失败，代替 exit(1) 返回给调用方
+    reason: timeout 超时，network 网络异常，throttled 多次被限流，deadline 超过文章截止时间
     """
 
-    # 连接mysql
-    def __init__(self):
+    def __init__(self, url: str, reason: str, detail: str = ''):
+        super().__init__('[ %s ] %s %s' % (reason, url, detail))
+        self.url = url
+        self.reason = reason
+
+
+# 当前线程正在处理的文章的截止时间，at 为None时不限制
+DEADLINE = threading.local()
+
+
+# 距文章截止时间的剩余秒数
+def remaining(url: str):
+    """
+    :param url:     请求地址，超时时用于报错
+    :return:        剩余秒数，没有截止时间时为None
+    """
+
+    at = getattr(DEADLINE, 'at', None)
+    if at is None:
+        return None
+    left = at - time.time()
+    if left <= 0:
+        raise FETCHERROR(url=url, reason='deadline')
+    return left
+
+
+# 按域名自适应限速
+class RATELIMIT(object):
+    """
+    每个域名一个令牌桶，按 AIMD 调整速率：请求正常时缓慢加速，被限流（429/503/反爬页面）时减半
+    响应带 Retry-After 时在该时间之前暂停该域名的所有请求
+    """
+
+    # 域名 -> {'rate': 每秒请求数, 'tokens': 可用令牌, 'time': 上次补充时间, 'until': 暂停到什么时候}
+    buckets = {}
+    lock = threading.Lock()
+
+    # 获取域名对应的令牌桶，调用方需持有锁
+    @classmethod
+    def bucket(cls, host: str):
+        """
+        :param host:    域名
+        :return:
+        """
 
-        # 返回连接对象
-        self.db = pymysql.connect(
+        if host not in cls.buckets:
+            rates = CONFIG.get('rateLimit')
+            cls.buckets[host] = {'rate': float(rates.get(host, rates.get('default'))),
+                                 'tokens': 1.0, 'time': time.time(), 'until': 0}
+        return cls.buckets[host]
+
+    # 请求前获取令牌，没有令牌时等待
+    @classmethod
+    def acquire(cls, url: str):
+        """
+        :param url:     请求地址，用于提取域名
+        :return:
+        """
+
+        host = urlparse(url).netloc
+        while True:
+            with cls.lock:
+                bucket = cls.bucket(host)
+                now = time.time()
+                bucket['tokens'] = min(CONFIG.get('rateBurst'),
+                                       bucket['tokens'] + (now - bucket['time']) * bucket['rate'])
+                bucket['time'] = now
+
+                # 被限流暂停中，或令牌不足
+                wait = bucket['until'] - now
+                if wait <= 0:
+                    if bucket['tokens'] >= 1:
+                        bucket['tokens'] -= 1
+                        return
+                    wait = (1 - bucket['tokens']) / bucket['rate']
+
+            # 等待会超过文章截止时间时直接放弃
+            left = remaining(url)
+            if left is not None and wait >= left:
+                raise FETCHERROR(url=url, reason='deadline', detail='限速等待 %.1fs' % wait)
+
+            time.sleep(wait)
+
+    # 根据响应调整速率
+    @classmethod
+    def feedback(cls, url: str, res):
+        """
+        :param url:     请求地址
+        :param res:     响应对象
+        :return:        是否被限流，被限流时调用方应重试
+        """
+
+        throttled = cls.throttled(res)
+        host = urlparse(url).netloc
+
+        with cls.lock:
+            bucket = cls.bucket(host)
+
+            # 乘性减速，并按 Retry-After 暂停
+            if throttled:
+                bucket['rate'] = max(CONFIG.get('rateMin'), bucket['rate'] * CONFIG.get('rateDecrease'))
+                bucket['tokens'] = 0
+                bucket['until'] = max(bucket['until'], time.time() + cls.retryAfter(res))
+                rate = bucket['rate']
+
+            # 加性加速，约每秒增加 rateIncrease
+            else:
+                bucket['rate'] = min(CONFIG.get('rateMax'), bucket['rate'] + CONFIG.get('rateIncrease') / bucket['rate'])
+
+        if throttled:
+            LOG(msg='[ 限速 ] [ %s ] 被限流 [ %d ]，速率降至 %.2f/s' % (host, res.status_code, rate))
+
+        return throttled
+
+    # 判断响应是否为限流或反爬页面
+    @staticmethod
+    def throttled(res):
+        """
+        :param res:     响应对象
+        :return:
+        """
+
+        if res.status_code in CONFIG.get('throttleStatus'):
+            return True
+
+        # 部分站点拦截时仍返回200，只检查html页面开头
+        if 'html' in res.headers.get('Content-Type', ''):
+            return antiBotPattern.search(res.content[:4096].decode('utf-8', 'ignore')) is not None
+        return False
+
+    # 解析 Retry-After，秒数或HTTP日期，没有时使用默认等待时间
+    @staticmethod
+    def retryAfter(res):
+        """
+        :param res:     响应对象
+        :return:        需要等待的秒数
+        """
+
+        value = (res.headers.get('Retry-After') or '').strip()
+        if value.isdigit():
+            return min(float(value), CONFIG.get('retryAfterMax'))
+        try:
+            return min(max(0, parsedate_to_datetime(value).timestamp() - time.time()), CONFIG.get('retryAfterMax'))
+        except Exception:
+            return CONFIG.get('wait')
+
+    # 各域名当前速率
+    @classmethod
+    def rates(cls):
+        """
+        :return:    域名 -> 每秒请求数
+        """
+
+        with cls.lock:
+            return {host: round(bucket['rate'], 2) for host, bucket in cls.buckets.items()}
+
+
+# 数据库连接池
+class POOL(object):
+    """
+    进程内共享的mysql连接池，连接归还后复用，空闲超过一定时间再次取出时先做健康检查
+    连接开启 autocommit，只读查询不再单独提交，写入需要事务时显式 begin
+    """
+
+    # 日志前缀
+    prefix = '[ POOL ]'
+    # 空闲连接: (连接, 归还时间)，后进先出，优先复用最近用过的连接
+    idle = queue.LifoQueue()
+    # 限制同时借出的连接数，防止突发请求打满 max_connections
+    slots = threading.BoundedSemaphore(CONFIG.get('mysqlPoolSize'))
+    # 创建连接池的进程，子进程不能复用父进程的连接
+    pid = os.getpid()
+    lock = threading.Lock()
+
+    # 新建连接
+    @classmethod
+    def connect(cls):
+        """
+        :return:
+        """
+
+        return pymysql.connect(
             host=CONFIG.get('mysqlHost'),
             user=CONFIG.get('mysqlUser'),
             port=CONFIG.get('mysqlPort'),
             password=CONFIG.get('mysqlPassword'),
             database=CONFIG.get('mysqlDB'),
+            autocommit=True,
         )
 
+    # 借出连接
+    @classmethod
+    def acquire(cls):
+        """
+        :return:
+        """
+
+        # fork 出的子进程重建连接池，丢弃继承自父进程的连接
+        with cls.lock:
+            if cls.pid != os.getpid():
+                cls.idle = queue.LifoQueue()
+                cls.slots = threading.BoundedSemaphore(CONFIG.get('mysqlPoolSize'))
+                cls.pid = os.getpid()
+
+        if not cls.slots.acquire(timeout=CONFIG.get('mysqlPoolTimeout')):
+            raise RuntimeError('数据库连接池已满，等待 [ %d ] 秒后仍无可用连接' % CONFIG.get('mysqlPoolTimeout'))
+
+        try:
+            while True:
+                try:
+                    conn, releaseTime = cls.idle.get_nowait()
+                except queue.Empty:
+                    return cls.connect()
+
+                # 最近用过的连接直接复用
+                if time.time() - releaseTime < CONFIG.get('mysqlPoolCheck'):
+                    return conn
+
+                # 空闲较久的连接先检查，失效则丢弃
+                try:
+                    conn.ping(reconnect=False)
+                    return conn
+                except Exception:
+                    cls.close(conn)
+
+        # 建立连接失败时归还名额
+        except Exception:
+            cls.slots.release()
+            raise
+
+    # 归还连接
+    @classmethod
+    def release(cls, conn):
+        """
+        :param conn:    借出的连接
+        :return:
+        """
+
+        # 连接池已在子进程中重建，不归还旧连接
+        if cls.pid != os.getpid():
+            return
+
+        # 已断开的连接不再复用
+        if conn.open:
+            cls.idle.put((conn, time.time()))
+        else:
+            cls.close(conn)
+        cls.slots.release()
+
+    # 关闭连接
+    @classmethod
+    def close(cls, conn):
+        """
+        :param conn:    连接
+        :return:
+        """
+
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# 数据库操作类
+class DB(object):
+    """
+    数据库操作类
+    """
+
+    # 连接mysql
+    def __init__(self):
+
+        # 从连接池借出连接
+        self.db = POOL.acquire()
+
+    # 上下文管理，退出时（包括异常）归还连接
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        self.closeDB()
+
     # 查询数据库
-    def queryDB(self, sql: str):
+    def queryDB(self, sql: str, args: tuple = None):
         """
         :param sql:     查询语句
+        :param args:    查询参数，对应sql中的 %s 占位符
         :return:
         """
 
@@ -150,25 +719,52 @@ class DB(object):
         try:
 
             # 执行sql 获取结果
-            cursor.execute(sql)
+            cursor.execute(sql, args)
             result = cursor.fetchall()
 
-            # 提交事务关闭游标
-            self.db.commit()
+            # autocommit 连接，只读查询无需提交
             cursor.close()
 
             return result
 
         except Exception as e:
             LOG(msg="[ 数据查询异常 ]: %s" % e)
-            self.db.commit()
             cursor.close()
             return False
 
+    # 流式查询，服务端游标逐批读取，内存占用与结果大小无关
+    def streamDB(self, sql: str, args: tuple = None):
+        """
+        生成器读取完毕或中途关闭时归还连接，调用方无需再执行 closeDB
+        :param sql:     查询语句
+        :param args:    查询参数
+        :return:        逐行返回
+        """
+
+        cursor = self.db.cursor(pymysql.cursors.SSCursor)
+        finished = False
+        try:
+            cursor.execute(sql, args)
+            while True:
+                rows = cursor.fetchmany(CONFIG.get('exportBatch'))
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+            cursor.close()
+            finished = True
+
+        # 客户端中途断开时直接关闭连接，避免读完剩余结果
+        finally:
+            if not finished:
+                POOL.close(self.db)
+            self.closeDB()
+
     # 通用插入方法
-    def insertDB(self, sql: str):
+    def insertDB(self, sql: str, args: tuple = None):
         """
         :param sql:     插入语句
+        :param args:    参数化语句的参数
         :return:
         """
 
@@ -176,7 +772,7 @@ class DB(object):
         cursor = self.db.cursor()
 
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, args)
             self.db.commit()
         except Exception as e:
             LOG(msg="[ 数据写入异常 ]: %s" % e)
@@ -184,27 +780,223 @@ class DB(object):
         cursor.close()
 
     # 保存抓取数据
-    def saveData(self, table: str, values: list):
+    def saveData(self, table: str, values: list, exchange: str, state: tuple = None):
         """
-        :param table:   表名称
-        :param values:  值列表
-        :return:
+        :param table:       表名称
+        :param values:      值列表
+        :param exchange:    交易所/站点标识
+        :param state:       (来源标识, 进度字段)，与新闻在同一事务中写入
+        :return:            是否写入成功
         """
 
         # 获取游标
         cursor = self.db.cursor()
 
-        # 列表生成式，生成正确的sql
-        sql = "INSERT INTO %s" \
-              "(nid, title, sub_title, img, content, lang, source_url, created) " \
-              "VALUE (%s)" % (table, ','.join(["'%s'" % str(item) for item in values]))
+        # 生成参数化sql，值由驱动转义
+        columns = ['nid', 'title', 'sub_title', 'img', 'content', 'lang', 'source_url', 'created', 'exchange']
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
 
         try:
-            cursor.execute(sql)
+            self.db.begin()
+            cursor.execute(sql, values + [exchange])
+            # 同一事务内写入全文检索数据、累加新闻计数
+            cursor.execute('insert into newsText (id, title, sub_title, content) values (%s, %s, %s, %s)',
+                           (cursor.lastrowid, values[1], values[2], plainText(values[4])))
+            self.incrCounter(cursor, exchange=exchange, lang=values[5])
+            # 同一事务内递增数据版本号，通知API失效缓存
+            cursor.execute('update newsVersion set version = version + 1 where id = 1')
+            # 同一事务内推进抓取进度
+            if state is not None:
+                self.saveState(cursor, *state)
             self.db.commit()
+            saved = True
         except Exception as e:
+            self.db.rollback()
             LOG(msg="[ 数据写入异常 ]: %s" % e)
+            saved = False
+
+        cursor.close()
+        return saved
+
+    # 读取抓取进度
+    def crawlState(self, source: str):
+        """
+        :param source:  来源标识
+        :return:        last_nid、last_created、walk_cursor、last_pass，没有记录时为空字典
+        """
+
+        result = self.queryDB(sql='select last_nid, last_created, walk_cursor, last_pass from crawlState '
+                                  'where source = %s', args=(source,))
+        if not result:
+            return {}
+        return dict(zip(['last_nid', 'last_created', 'walk_cursor', 'last_pass'], result[0]))
+
+    # 写入抓取进度，与新闻写入在同一事务中执行
+    def saveState(self, cursor, source: str, fields: dict):
+        """
+        :param cursor:  写入新闻所用的游标
+        :param source:  来源标识
+        :param fields:  需要更新的字段，last_nid、last_created、walk_cursor、last_pass
+        :return:
+        """
+
+        columns = list(fields)
+        cursor.execute('insert into crawlState (source, %s) values (%%s, %s) on duplicate key update %s'
+                       % (', '.join(columns), ', '.join(['%s'] * len(columns)),
+                          ', '.join('%s = values(%s)' % (column, column) for column in columns)),
+                       [source] + [fields[column] for column in columns])
+
+    # 累加新闻计数，与新闻写入在同一事务中执行
+    def incrCounter(self, cursor, exchange: str, lang: str, count: int = 1):
+        """
+        :param cursor:      写入新闻所用的游标
+        :param exchange:    交易所/站点标识
+        :param lang:        语言
+        :param count:       新增条数
+        :return:
+        """
+        cursor.execute('insert into newsCounter (exchange, lang, total) values (%s, %s, %s) '
+                       'on duplicate key update total = total + values(total)', (exchange or '', lang or '', count))
+
+    # 查询新闻计数
+    def countNews(self, exchange: str = None, lang: str = None, groupBy: list = None):
+        """
+        :param exchange:    按交易所/站点筛选
+        :param lang:        按语言筛选
+        :param groupBy:     分组字段，exchange 和/或 lang
+        :return:            未分组时返回总数，分组时返回 [(分组值..., 条数)]，查询失败时为None
+        """
+
+        where, args = [], []
+        if exchange is not None:
+            where.append('exchange = %s')
+            args.append(exchange)
+        if lang is not None:
+            where.append('lang = %s')
+            args.append(lang)
+
+        groupBy = groupBy or []
+        sql = 'select %s from newsCounter' % ', '.join(groupBy + ['sum(total)'])
+        if where:
+            sql += ' where ' + ' and '.join(where)
+        if groupBy:
+            sql += ' group by %s order by %s' % (', '.join(groupBy), ', '.join(groupBy))
+
+        # 查询失败时返回None
+        result = self.queryDB(sql=sql, args=args)
+        if result is False:
+            return None
+        if groupBy:
+            return [item[:-1] + (int(item[-1]),) for item in result]
+        return int(result[0][0] or 0) if result else 0
+
+    # 记录失败的新闻/图片，按指数退避安排下次重试，超过最大次数后不再重试
+    def deadLetter(self, sourceUrl: str, kind: str, source: str, entry: dict, error: Exception, state: tuple = None):
+        """
+        :param sourceUrl:   新闻源地址
+        :param kind:        news 新闻详情，img 图片
+        :param source:      来源标识
+        :param entry:       重试所需的数据
+        :param error:       失败原因
+        :param state:       (来源标识, 进度字段)，与重试记录在同一事务中写入
+        :return:            是否记录成功
+        """
+
+        now = time.time()
+        errorClass = type(error).__name__
+        if getattr(error, 'reason', None):
+            errorClass += ':' + error.reason
+
+        # 已有记录时次数加一，退避时间为 retryBase * 2^(次数-1)，最长 retryMax
+        sql = 'insert into newsRetry (source_url, kind, source, entry, error_class, error, attempts, next_attempt, ' \
+              'created) values (%s, %s, %s, %s, %s, %s, 1, %s, %s) on duplicate key update ' \
+              'error_class = values(error_class), error = values(error), attempts = attempts + 1, ' \
+              'next_attempt = if(attempts >= %s, null, %s + least(%s * pow(2, attempts - 1), %s))'
+        args = (sourceUrl, kind, source, json.dumps(entry, ensure_ascii=False), errorClass[:64], str(error),
+                now + CONFIG.get('retryBase'), now,
+                CONFIG.get('retryAttempts'), now, CONFIG.get('retryBase'), CONFIG.get('retryMax'))
+
+        cursor = self.db.cursor()
+        try:
+            self.db.begin()
+            cursor.execute(sql, args)
+            # 同一事务内推进抓取进度，失败的新闻不再阻塞后面的新闻
+            if state is not None:
+                self.saveState(cursor, *state)
+            self.db.commit()
+            recorded = True
+        except Exception as e:
+            self.db.rollback()
+            LOG(msg="[ 重试记录写入异常 ] [ %s ]: %s" % (sourceUrl, e))
+            recorded = False
+        cursor.close()
+
+        return recorded
+
+    # 取出到期需要重试的记录，同时把下次重试时间推后 retryBase，处理中（如排队下载的图片）的记录不会被重复取出
+    def dueRetries(self, sources: list, limit: int):
+        """
+        :param sources: 本程序负责的来源标识，另一个程序的记录不取出
+        :param limit:   最多取多少条
+        :return:        [(source_url, kind, source, entry)]
+        """
+
+        now = time.time()
+        sql = 'select source_url, kind, source, entry from newsRetry where source in (%s) and next_attempt <= %%s ' \
+              'order by next_attempt limit %%s for update' % ', '.join(['%s'] * len(sources))
+
+        cursor = self.db.cursor()
+        try:
+            self.db.begin()
+            cursor.execute(sql, list(sources) + [now, limit])
+            result = cursor.fetchall()
+            for sourceUrl, kind, source, entry in result:
+                cursor.execute('update newsRetry set next_attempt = %s where source_url = %s and kind = %s',
+                               (now + CONFIG.get('retryBase'), sourceUrl, kind))
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            LOG(msg="[ 重试记录读取异常 ]: %s" % e)
+            result = ()
+        cursor.close()
+
+        return [(sourceUrl, kind, source, json.loads(entry)) for sourceUrl, kind, source, entry in result]
+
+    # 重试成功，删除记录
+    def clearRetry(self, sourceUrl: str, kind: str):
+        """
+        :param sourceUrl:   新闻源地址
+        :param kind:        news 新闻详情，img 图片
+        :return:
+        """
+        self.insertDB(sql='delete from newsRetry where source_url = %s and kind = %s', args=(sourceUrl, kind))
 
+    # 执行数据库迁移
+    def migrate(self):
+        """
+        每条迁移语句只执行一次，已执行的记录在 newsMigration 中（按语句哈希，两个程序共用）
+        :return:
+        """
+
+        cursor = self.db.cursor()
+        cursor.execute('create table if not exists newsMigration (name char(40) primary key, statement text, '
+                       'applied timestamp not null default current_timestamp)')
+        cursor.execute('select name from newsMigration')
+        applied = set(item[0] for item in cursor.fetchall())
+
+        for sql in MIGRATIONS:
+            name = hashlib.sha1(sql.encode('utf-8')).hexdigest()
+            if name in applied:
+                continue
+            try:
+                cursor.execute(sql)
+                LOG(msg="[ 数据库迁移 ]: %s" % sql)
+            except pymysql.err.OperationalError as e:
+                # 1050 表已存在，1060 字段已存在，1061 索引已存在
+                if e.args[0] not in (1050, 1060, 1061):
+                    raise
+            cursor.execute('insert ignore into newsMigration (name, statement) values (%s, %s)', (name, sql))
+        self.db.commit()
         cursor.close()
 
     # 关闭连接
@@ -212,7 +1004,12 @@ class DB(object):
         """
         :return:
         """
-        self.db.close()
+
+        # 归还连接，重复调用时忽略
+        if self.db is None:
+            return
+        POOL.release(self.db)
+        self.db = None
 
 
 # 新闻采集类
@@ -221,6 +1018,11 @@ class COLLECT(object):
     抓取类
     """
 
+    # 交易所/站点标识
+    exchange = 'ml'
+    # 抓取进度标识，与 runNews.py 的 ML 站点分开记录（本程序发布时间为毫秒）
+    source = 'COLLECT'
+
     # 中文判断
     def is_chinese(self, string: str):
         """
@@ -239,132 +1041,261 @@ class COLLECT(object):
         :return:
         """
 
-        # 获取数据库数据条数
-        # 获取mysql对象
-        db = DB()
-        # 获取数据库已有新闻条数
-        saveCount = db.queryDB(sql="select total from spiderLimit")[0][0]
+        # 异常退出时同样归还连接
+        with DB() as db:
+            self.collect(db=db)
+
+        LOG(msg='[ 限速 ] 当前速率: %s' % RATELIMIT.rates())
+
+    # 抓取进度之后的新闻逐条入库
+    def collect(self, db: DB):
+        """
+        :param db:      mysql对象
+        :return:
+        """
 
-        # 获取 新闻 总数
-        newsTotal = int(json.loads(self.getNeswIndex())['total'])
+        # 读取抓取进度
+        state = db.crawlState(source=self.source)
 
-        # 判断是否存在未抓取的新闻进行循环
-        while newsTotal > saveCount:
-            # 抓取数据
-            self.spider(newsTotal=newsTotal, saveCount=saveCount)
+        # 从最新的新闻往前翻，直到衔接上已抓取的进度
+        try:
+            News = self.newNews(state=state)
+        except FETCHERROR as e:
+            LOG(msg='新闻列表获取失败，本次抓取结束: %s' % e)
+            return
+        LOG(msg='发现 [ %d ] 条新新闻' % len(News))
 
-            time.sleep(CONFIG.get('wait'))
-            # 更新nesTotal，saveCount
-            saveCount = db.queryDB(sql="select total from spiderLimit")[0][0]
-            newsTotal = int(json.loads(self.getNeswIndex())['total'])
+        # 时间评估
+        beginTime = time.time()
+        # 从最老的开始抓取，每条新闻写入时同时推进进度，中断后下次从断点继续
+        saved = 0
+        for new in reversed(News):
+            if not self.spider(db=db, new=new):
+                LOG(msg='文章 [ %s ] 写入失败，本次抓取结束，下次从该新闻继续' % new['nid'])
+                break
+            saved += 1
 
         # 已经抓完的情况
-        LOG(msg='[ 完成 ] 当前新闻总数 [ %d ] 条， 已抓取 [ %d ] 条' % (newsTotal, saveCount))
+        LOG(msg='[ 完成 ] 本次处理 [ %d ] 条，耗时 [ %d ] 秒， 已入库 [ %d ] 条'
+                % (saved, time.time() - beginTime, db.countNews(exchange=self.exchange)))
 
-        # 关闭mysql连接
-        db.closeDB()
+    # 判断新闻是否在抓取进度之后
+    def isNew(self, new: dict, state: dict):
+        """
+        :param new:     列表中的新闻
+        :param state:   抓取进度
+        :return:
+        """
+
+        if state.get('last_created') is None:
+            return True
+
+        # 同一时间发布的多条新闻按 nid 区分
+        nid = int(new['nid']) if str(new['nid']).isdigit() else 0
+        lastNid = int(state['last_nid']) if str(state.get('last_nid')).isdigit() else 0
+        return (float(new['created']), nid) > (float(state['last_created']), lastNid)
+
+    # 获取抓取进度之后的新闻
+    def newNews(self, state: dict):
+        """
+        :param state:   抓取进度
+        :return:        新闻列表，从新到旧
+        """
+
+        News = []
+        seen = set()
+        offset = 0
+        while True:
+
+            # 翻页期间有新新闻发布时，列表会整体后移，已看过的不再重复
+            results = json.loads(self.getNeswIndex(offset=offset))['results']
+            News += [new for new in results if new['nid'] not in seen and self.isNew(new=new, state=state)]
+            seen.update(new['nid'] for new in results)
+            offset += 10
+
+            # 已经翻到最老的新闻，或本页已出现抓取过的新闻，不再往前翻；没有抓取进度时抓取全部历史新闻
+            if not results or not all(self.isNew(new=new, state=state) for new in results):
+                break
+
+        return News
 
     # 核心抓取函数
-    def spider(self, newsTotal: int, saveCount: int):
+    def spider(self, db: DB, new: dict):
+        """
+        :param db:      mysql对象
+        :param new:     列表中的新闻
+        :return:        是否处理成功，成功后抓取进度推进到该新闻
         """
-        :param newsTotal:    新闻总数
-        :param saveCount:    已经抓取的新闻总数
+
+        # 该新闻处理完成后的进度
+        state = (self.source, {'last_nid': str(new['nid']), 'last_created': new['created'],
+                               'walk_cursor': None, 'last_pass': time.time()})
+
+        # 判断新闻是否为英文
+        if not self.is_chinese(string=new['title']):
+            # 是英文直接跳过，只推进进度
+            cursor = db.db.cursor()
+            db.saveState(cursor, *state)
+            cursor.close()
+            return True
+
+        # 图片和详情的请求不超过文章截止时间
+        DEADLINE.at = time.time() + CONFIG.get('articleDeadline')
+        try:
+            values, imgError = self.fetchNews(new=new)
+
+        # 抓取或解析失败，加入重试队列并推进进度，不阻塞后面的新闻
+        except Exception as e:
+            LOG(msg='文章 [ %s ] 抓取失败，已加入重试队列: %s' % (new['nid'], e))
+            return db.deadLetter(sourceUrl='https://theedgemalaysia.com/node/%s' % new['nid'], kind='news',
+                                 source=self.source, entry=self.toEntry(new=new), error=e, state=state)
+        finally:
+            DEADLINE.at = None
+
+        # 插入mysql，同时推进抓取进度
+        saved = db.saveData(table='news', values=values, exchange=self.exchange, state=state)
+
+        # 图片下载失败时新闻先入库，图片加入重试队列
+        if saved and imgError is not None:
+            self.retryImg(db=db, new=new, error=imgError)
+
+        return saved
+
+    # 图片加入重试队列
+    def retryImg(self, db: DB, new: dict, error: Exception):
+        """
+        :param db:      mysql对象
+        :param new:     列表中的新闻
+        :param error:   失败原因
         :return:
         """
 
-        # 获取mysql对象
-        db = DB()
-        # 计算 新闻列表 API offset，目的是从最老的新闻开始获取
-        # 定义 API 每次返回的条数，也是需要抓取的条数
-        limit = 10
-        offset = newsTotal - saveCount - limit
+        LOG(msg="文章 [ %s ] 中的图片下载失败，已加入重试队列: %s" % (new['nid'], error))
+        db.deadLetter(sourceUrl='https://theedgemalaysia.com/node/%s' % new['nid'], kind='img', source=self.source,
+                      entry={'url': new['img'], 'fileName': '%s/%s.jpg' % (CONFIG.get('imgDir'), new['nid']),
+                             'imgPath': '%s/%s.jpg' % (CONFIG.get('imgUrl'), new['nid'])},
+                      error=error)
 
-        # 判断 未抓取新闻 不超过10条的情况
-        if offset < 0:
-            # 重新定义需要抓取的条数
-            limit += offset
-            # 重新定义 开始抓取的位置
-            offset = 0
-        LOG(msg='总数据为 [ %d ] 条，正在抓取第 [ %d - %d ] 条新闻' % (newsTotal, offset, offset + limit))
+    # 列表中的新闻转为重试记录，与 runNews.py 的列表条目字段一致（发布时间为秒）
+    def toEntry(self, new: dict):
+        """
+        :param new:     列表中的新闻
+        :return:        重试记录中的新闻条目
+        """
 
-        # 计算已抓取总数
-        saveCount += limit
+        return {'id': str(new['nid']), 'source_url': 'https://theedgemalaysia.com/node/%s' % new['nid'],
+                'title': new['title'], 'sub_title': new['summary'], 'img': new['img'],
+                'lang': new['language'], 'created': new['created'] / 1000}
 
-        # 重新获取正确的需要抓取的新闻列表
-        News = json.loads(self.getNeswIndex(offset=offset))['results']
+    # 重试记录还原为列表中的新闻
+    def fromEntry(self, entry: dict):
+        """
+        :param entry:   重试记录中的新闻条目
+        :return:        列表中的新闻
+        """
 
-        # 时间评估
-        beginTime = time.time()
-        # 循环抓取
-        for new in News:
+        return {'nid': entry['id'], 'title': entry['title'], 'summary': entry['sub_title'], 'img': entry['img'],
+                'language': entry['lang'], 'created': int(round(entry['created'] * 1000))}
 
-            # 判断limit 是否小于0，是说明已经抓取完毕，直接退出
-            if limit <= 0:
-                break
+    # 下载图片并抓取详情，组装入库数据
+    def fetchNews(self, new: dict):
+        """
+        :param new:     列表中的新闻
+        :return:        (news 表的一行数据, 图片下载失败的原因)
+        """
 
-            # 判断新闻是否为英文
-            if not self.is_chinese(string=new['title']):
-                # 是英文直接跳过本次循环
-                limit -= 1
-                continue
+        # 定义需要存储的预数据
+        values = [new['nid'], new['title'], new['summary']]
+
+        # 下载图片
+        imgError = None
+        # 判断该新闻有无图片
+        if new['img'] != '':
+            imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), new['nid'])
+
+            # 如果未成功下载则重试几次
+            try:
+                saveStatus = False
+                for i in range(CONFIG.get('retry') + 1):
+                    saveStatus = self.download(fileName=imgName, url=new['img'])
+                    if saveStatus:
+                        break
+                if not saveStatus:
+                    imgError = Exception('图片保存失败')
+            except FETCHERROR as e:
+                imgError = e
 
-            # 定义需要存储的预数据
-            values = [new['nid'], new['title'].replace('\'', '"'), new['summary'].replace('\'', '"')]
-
-            # 下载图片
-            # 判断该新闻有无图片
-            if new['img'] != '':
-                imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), new['nid'])
-                # 判断图片是否下载成功
-                if not self.download(fileName=imgName, url=new['img']):
-
-                    saveStatus = False
-                    # 如果未成功下载则重试两次
-                    for i in range(CONFIG.get('retry')):
-                        saveStatus = self.download(fileName=imgName, url=new['img'])
-                        if saveStatus:
-                            break
-                    # 判断最终图片是否保存成功
-                    if not saveStatus:
-                        LOG(msg="文章 [ %s ] 中的图片下载失败，请重新运行程序"
-                                "或者联系管理员核实" % new['nid'])
-                        exit(1)
-
-                # 组装图片数据
-                values.append('%s/%s.jpg' % (CONFIG.get('imgUrl'), new['nid']))
-
-            # 如果不存在图片
-            else:
-                # 组装图片数据
-                values.append('')
+            # 组装图片数据，下载失败时先留空
+            values.append('%s/%s.jpg' % (CONFIG.get('imgUrl'), new['nid']) if imgError is None else '')
 
-            # 文章详情抓取
-            content = self.getNewsDetails(path='node/%s' % new['nid']).replace('\'', '"')
+        # 如果不存在图片
+        else:
+            # 组装图片数据
+            values.append('')
 
-            # 组装文章详情
-            values.append(content)
-            values.append(new['language'])
-            values.append('https://theedgemalaysia.com/node/%s' % new['nid'])
-            values.append(new['created'])
+        # 文章详情抓取
+        content = self.getNewsDetails(path='node/%s' % new['nid'])
 
-            # 插入mysql
-            db.saveData(table='news', values=values)
+        # 组装文章详情
+        values.append(content)
+        values.append(new['language'])
+        values.append('https://theedgemalaysia.com/node/%s' % new['nid'])
+        values.append(new['created'])
+
+        return values, imgError
+
+    # 失败重试
+    def RETRY(self):
+        """
+        :return:
+        """
 
-            # 更新limit
-            limit -= 1
+        # 异常退出时同样归还连接
+        with DB() as db:
+            self.redrive(db=db)
 
-        # 时间评估结束
-        endTime = time.time()
+    # 重新处理到期的记录
+    def redrive(self, db: DB):
+        """
+        :param db:      mysql对象
+        :return:
+        """
 
-        # 预估总时间
-        if offset != 0:
-            LOG(msg='还剩 [ %d ] 条新闻未抓取，预估时间为 [ %d ] 分钟' % (offset, offset / 10 * (endTime - beginTime) / 60))
+        # 只取本程序的记录，各站点适配器的记录由 runNews.py 处理
+        rows = db.dueRetries(sources=[self.source], limit=CONFIG.get('retryBatch'))
+
+        done = 0
+        for sourceUrl, kind, source, entry in rows:
+            DEADLINE.at = time.time() + CONFIG.get('articleDeadline')
+            try:
+                # 重新下载图片并回填
+                if kind == 'img':
+                    if not self.download(fileName=entry['fileName'], url=entry['url']):
+                        raise Exception('图片保存失败')
+                    db.insertDB(sql='update news set img = %s where source_url = %s', args=(entry['imgPath'], sourceUrl))
+                    db.insertDB(sql='update newsVersion set version = version + 1 where id = 1')
+
+                # 重新抓取新闻，已经写入的直接删除记录；不推进抓取进度
+                elif not db.queryDB(sql='select id from news where source_url = %s', args=(sourceUrl,)):
+                    new = self.fromEntry(entry=entry)
+                    values, imgError = self.fetchNews(new=new)
+                    if not db.saveData(table='news', values=values, exchange=self.exchange):
+                        raise Exception('数据写入失败')
+                    if imgError is not None:
+                        self.retryImg(db=db, new=new, error=imgError)
+
+            # 再次失败，次数加一并推迟
+            except Exception as e:
+                db.deadLetter(sourceUrl=sourceUrl, kind=kind, source=source, entry=entry, error=e)
+                continue
+            finally:
+                DEADLINE.at = None
 
-        # 更新抓取总数
-        db.insertDB(sql='update spiderLimit set total=%d' % saveCount)
+            db.clearRetry(sourceUrl=sourceUrl, kind=kind)
+            done += 1
 
-        # 关闭数据库连接
-        db.closeDB()
+        if rows:
+            LOG(msg='[ 重试 ] 重试 [ %d ] 条，成功 [ %d ] 条' % (len(rows), done))
 
     # 文章页处理
     def getNewsDetails(self, path: str):
@@ -380,22 +1311,25 @@ class COLLECT(object):
         if isinstance(page_source, dict):
             return False
 
-        # 实例BS
-        soup = BeautifulSoup(page_source, features="html.parser")
-
-        # 提取文章详情的核心主体
-        pattern = re.compile(r'news-detail_newsTextDataWrap*')  # 正则模糊匹配
-        newsBody = soup.find("div", attrs={"class": pattern})
+        # 只解析文章详情的核心主体，未安装lxml时退回内置解析器
+        try:
+            soup = BeautifulSoup(page_source, features=CONFIG.get('htmlParser'), parse_only=newsBodyStrainer)
+        except FeatureNotFound:
+            soup = BeautifulSoup(page_source, features="html.parser", parse_only=newsBodyStrainer)
+        newsBody = soup.find("div", attrs={"class": newsBodyPattern})
 
         # 删除广告
-        if newsBody.find("div", attrs={"class": "inPageAd"}) is not None:
-            newsBody.find("div", attrs={"class": "inPageAd"}).decompose()
+        ad = newsBody.find("div", attrs={"class": "inPageAd"})
+        if ad is not None:
+            ad.decompose()
 
         # 删除底部英文链接
-        if newsBody.find("em") is not None and 'version' in newsBody.find("em").text:
-            newsBody.find("em").decompose()
-            if newsBody.find("a") is not None:
-                newsBody.find("a").decompose()
+        em = newsBody.find("em")
+        if em is not None and 'version' in em.text:
+            em.decompose()
+            link = newsBody.find("a")
+            if link is not None:
+                link.decompose()
             newsBody.find_all("div", attrs={"class": "newsTextDataWrapInner"})[-1].decompose()
 
         # 返回最终数据
@@ -467,33 +1401,43 @@ class COLLECT(object):
 
         # 预定义返回数据
         res = None
+        url = base_url + path
+        reason = 'network'
+
+        # 请求接口，失败或被限流时重试几次
+        for i in range(CONFIG.get('retry') + 1):
+
+            # 按该域名当前速率取得令牌，被限流时等到 Retry-After 之后
+            RATELIMIT.acquire(url)
+
+            # 读取超时不超过文章剩余时间
+            left = remaining(url)
+            readTimeout = CONFIG.get('readTimeout') if left is None else min(CONFIG.get('readTimeout'), left)
+
+            try:
+                res = requests.get(url=url, headers=headers, proxies=proxy,
+                                   timeout=(CONFIG.get('connectTimeout'), readTimeout))
+
+            # 超时或网络异常，等待后重试
+            except Exception as e:
+                reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'network'
+                LOG(msg="路径 [ %s ], %s" % (path, e))
+                res = None
+                left = remaining(url)
+                time.sleep(CONFIG.get('wait') if left is None else min(CONFIG.get('wait'), left))
+                continue
 
-        # 请求接口
-        try:
-            res = requests.get(url=base_url + path, headers=headers, proxies=proxy)
+            # 被限流或反爬拦截的响应不作为结果返回
+            if RATELIMIT.feedback(url, res):
+                reason = 'throttled'
+                res = None
+                continue
 
-        # 接口请求异常处理
-        except Exception as e:
-            LOG(msg="网络请求第一层异常捕获: %s" % e)
-            # 网络请求失败则重试几次
-            for i in range(CONFIG.get('retry')):
-                # 开始前先等待1s
-                time.sleep(CONFIG.get('wait'))
-                # 继续捕获重试异常
-                try:
-                    res = requests.get(url=base_url + path, headers=headers, proxies=proxy)
-                    # 请求成功则退出
-                    if res is not None:
-                        break
-                # 重试的过程中如果仍然请求失败，直接忽略
-                except Exception as e:
-                    LOG(msg="路径 [ %s ], %s" % (path, e))
-                    pass
-            # 再次判断
-            if res is None:
-                LOG(msg="路径 [ %s ] 详情抓取失败，请重新运行程序"
-                        "或者联系管理员核实" % path)
-                exit(1)
+            break
+
+        # 多次失败，交给调用方处理
+        if res is None:
+            raise FETCHERROR(url=url, reason=reason, detail='重试 %d 次后仍失败' % CONFIG.get('retry'))
 
         # 判断下载类型
         if urlType is None:
@@ -502,35 +1446,141 @@ class COLLECT(object):
         return res.content
 
 
+# 解析 fields 参数
+def parseFields(params, default: list):
+    """
+    :param params:      请求参数
+    :param default:     未传 fields 时返回的字段
+    :return:            字段列表，存在未知字段时返回None
+    """
+
+    if not params.get('fields'):
+        return default
+    if params.get('fields') == 'all':
+        return list(newsFields)
+
+    fields = [field.strip() for field in params.get('fields').split(',') if field.strip()]
+    if not fields or any(field not in newsFields for field in fields):
+        return None
+    return fields
+
+
+# 筛选值：数字
+def filterNumber(value: str):
+    """
+    :param value:   参数值
+    :return:
+    """
+    return float(value) if '.' in value else int(value)
+
+
+# 筛选值：前缀匹配，转义 like 通配符
+def filterPrefix(value: str):
+    """
+    :param value:   参数值
+    :return:
+    """
+    return re.sub(r'([\\%_])', r'\\\1', value) + '%'
+
+
+# 新闻详情的查询参数 -> news 表字段，都有对应索引
+newsKeys = OrderedDict([
+    ('id', 'id'),
+    ('nid', 'nid'),
+    ('source_url', 'source_url'),
+])
+
+
+# 新闻筛选条件: 参数 -> (sql 条件, 参数值转换)，只允许以下字段，且都有对应索引
+newsFilters = OrderedDict([
+    ('nid', ('nid = %s', str)),
+    ('exchange', ('exchange = %s', str)),
+    ('lang', ('lang = %s', str)),
+    ('since', ('created >= %s', filterNumber)),
+    ('until', ('created < %s', filterNumber)),
+    ('title', ('title like %s', filterPrefix)),
+])
+
+
+# 解析筛选参数
+def parseFilters(params, reserved: tuple):
+    """
+    :param params:      请求参数
+    :param reserved:    非筛选用途的参数，如 fields、limit
+    :return:            (sql 条件列表, 参数列表)，存在未知参数或取值错误时抛出 ValueError
+    """
+
+    where, args = [], []
+    for key, value in params.items(multi=True):
+        if key in reserved:
+            continue
+        if key not in newsFilters:
+            raise ValueError('不支持的筛选字段: %s' % key)
+
+        # 兼容旧的 title='马股持续下跌' 写法
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+
+        condition, convert = newsFilters[key]
+        try:
+            args.append(convert(value))
+        except ValueError:
+            raise ValueError('%s 参数值错误: %s' % (key, value))
+        where.append(condition)
+
+    if not where:
+        raise ValueError('至少需要一个筛选条件，可选: %s' % ','.join(newsFilters))
+    return where, args
+
+
+# 查询字段，前两列固定为 id、created 用于生成游标
+def newsColumns(fields: list, alias: str = None):
+    """
+    :param fields:  接口字段列表
+    :param alias:   news 表别名，多表查询时使用
+    :return:
+    """
+    prefix = '%s.' % alias if alias else ''
+    return ', '.join(prefix + column for column in ['id', 'created'] + [newsFields[field] for field in fields])
+
+
+# 数据映射函数
+def newsDict(item, fields: list):
+    """
+    :param item:    按 newsColumns 查询出的一行
+    :param fields:  接口字段列表
+    :return:
+    """
+    return dict(zip(fields, item[2:]))
+
+
+# 下一页游标
+def newsCursor(item):
+    """
+    :param item:    当前页最后一行
+    :return:        created,id
+    """
+    return '%s,%s' % (item[1], item[0])
+
+
 # 通用新闻查询
-def queryNews(sql: str):
+def queryNews(sql: str, args: tuple = None, fields: list = None):
     """
-    :param sql: 需要执行的sql
+    :param sql:     需要执行的sql，查询字段由 newsColumns 生成
+    :param args:    查询参数
+    :param fields:  接口字段列表，默认为全部字段
     :return:
     """
 
-    # 数据映射函数
-    def newsDict(item):
-        return {
-            'nid': item[1],
-            'title': item[2],
-            'abstract': item[3],
-            'img': item[4],
-            'content': item[5],
-            'lang': item[6],
-            'source_url': item[7],
-            'created': item[8]
-        }
+    fields = fields or list(newsFields)
 
-    # 获取数据库对象
-    db = DB()
     # 执行sql
-    result = db.queryDB(sql=sql)
-    db.closeDB()
+    with DB() as db:
+        result = db.queryDB(sql=sql, args=args)
 
     if result != ():
         # 数据映射
-        result = list(map(newsDict, result))
+        result = [newsDict(item, fields) for item in result]
 
     # 返回
     return result
@@ -539,16 +1589,20 @@ def queryNews(sql: str):
 # 新闻查询接口
 @api.route('/api/news', methods=['GET'])
 @generalTryCatch
+@cached
 def getNews():
     """
     :param: begin 可选, 从什么位置开始查询，不包含， 默认为：0
     :param: limit 可选, 查询多少条， 默认为：10
+    :param: after 可选, 上一页返回的游标，传入后忽略 begin，按 (created, id) 索引直接定位
+    :param: fields 可选, 返回字段，逗号分隔，all 为全部字段，默认为不含正文的列表字段
     :return:
     """
 
     # 默认参数
     begin = 0
     limit = 10
+    after = None
 
     # 获取参数
     params = flask.request.args
@@ -558,64 +1612,275 @@ def getNews():
     if 'limit' in params:
         limit = params.get('limit')
 
-    # 拼接sql
-    sql = 'select * from news order by created desc limit %d, %d' % (int(begin), int(limit))
+    if 'after' in params:
+        after = cursorPattern.match(params.get('after'))
+        if after is None:
+            return response(code=8400, result={
+                'type': "新闻查询",
+                'data': "after 参数格式错误，应为上一页返回的游标"
+            })
+
+    fields = parseFields(params, default=listFields)
+    if fields is None:
+        return response(code=8400, result={
+            'type': "新闻查询",
+            'data': "fields 参数错误，可选字段: %s" % ','.join(newsFields)
+        })
+
+    # 游标分页，深度翻页与第一页代价相同
+    if after is not None:
+        created, newsId = after.groups()
+        created = float(created) if '.' in created else int(created)
+        sql = 'select %s from news where created < %%s or (created = %%s and id < %%s) ' \
+              'order by created desc, id desc limit %%s' % newsColumns(fields)
+        args = (created, created, int(newsId), int(limit))
+
+    # 兼容 begin/limit 分页
+    else:
+        sql = 'select %s from news order by created desc, id desc limit %%s, %%s' % newsColumns(fields)
+        args = (int(begin), int(limit))
+
+    # 执行sql
+    with DB() as db:
+        result = db.queryDB(sql=sql, args=args)
 
     # 返回数据
     return response(code=8200, result={
         'type': "新闻查询",
         'begin': begin,
         'limit': limit,
-        'data': queryNews(sql=sql)
+        'fields': fields,
+        'after': newsCursor(result[-1]) if result else None,
+        'data': [newsDict(item, fields) for item in result]
+    })
+
+
+# 新闻详情接口
+@api.route('/api/newsDetail', methods=['GET'])
+@generalTryCatch
+@cached
+def newsDetail():
+    """
+    :param: id/nid/source_url 必选其一, 新闻id（列表接口返回的 id）、文章id 或新闻源地址
+    :param: fields 可选, 返回字段，逗号分隔，默认为全部字段
+    :return:
+    """
+
+    # 获取参数
+    params = flask.request.args
+    fields = parseFields(params, default=list(newsFields))
+    keys = [key for key in newsKeys if params.get(key)]
+    if len(keys) != 1 or (keys[0] == 'id' and not params.get('id').isdigit()) or fields is None:
+        return response(code=8400, result={
+            'type': "新闻详情",
+            'data': "需要 %s 其中一个参数，或 fields 参数错误，可选字段: %s" % ('/'.join(newsKeys), ','.join(newsFields))
+        })
+
+    # 按 id/nid/source_url 索引查询
+    sql = 'select %s from news where %s = %%s limit 1' % (newsColumns(fields), newsKeys[keys[0]])
+    result = queryNews(sql=sql, args=(params.get(keys[0]),), fields=fields)
+
+    # 返回数据
+    return response(code=8200, result={
+        'type': "新闻详情",
+        'data': result[0] if result else None
     })
 
 
 # 新闻查询接口
 @api.route('/api/newsCount', methods=['GET'])
 @generalTryCatch
+@cached
 def newsCount():
     """
+    :param: exchange 可选, 只统计该交易所/站点
+    :param: lang 可选, 只统计该语言
+    :param: by 可选, 分组统计，exchange、lang 或 exchange,lang
     :return:
     """
 
-    # 获取数据库对象
-    db = DB()
-
-    # 拼接sql
-    sql = 'select count(id) from news'
+    # 获取参数
+    params = flask.request.args
+    groupBy = [field.strip() for field in params.get('by', '').split(',') if field.strip()]
+    if any(field not in ('exchange', 'lang') for field in groupBy):
+        return response(code=8400, result={
+            'type': "新闻总数查询",
+            'data': "by 参数错误，可选: exchange,lang"
+        })
+
+    # 读取写入时维护的计数，不再扫描新闻表
+    with DB() as db:
+        total = db.countNews(exchange=params.get('exchange'), lang=params.get('lang'))
+        breakdown = db.countNews(exchange=params.get('exchange'), lang=params.get('lang'),
+                                 groupBy=groupBy) if groupBy else []
+
+    # 查询失败
+    if total is None or breakdown is None:
+        return response(code=8500, result={
+            'type': "新闻总数查询",
+            'data': "数据查询失败"
+        })
 
-    # 执行sql
-    result = db.queryDB(sql=sql)[0][0]
-    db.closeDB()
+    data = {
+        'newsCount': total
+    }
+    if groupBy:
+        data['breakdown'] = [dict(zip(groupBy + ['newsCount'], item)) for item in breakdown]
 
     # 返回数据
     return response(code=8200, result={
         'type': "新闻总数查询",
-        'data': {
-            'newsCount': result
-        }
+        'data': data
     })
 
 
 # 新闻筛选
 @api.route('/api/filterNews', methods=['GET'])
 @generalTryCatch
+@cached
 def filterNews():
     """
-    :param:     接受条件参数，如: nid=66981, title='马股持续下跌'
+    :param:     筛选条件，可组合，如: exchange=ml&lang=chinese&since=1701316178000
+                nid、exchange、lang 精确匹配，since/until 为发布时间范围，title 为标题前缀
+    :param: limit 可选, 查询多少条， 默认为：10
+    :param: after 可选, 上一页返回的游标
+    :param: fields 可选, 返回字段，同新闻查询接口
     :return:
     """
 
     # 获取参数
     params = flask.request.args
+    limit = params.get('limit', 10)
+
+    fields = parseFields(params, default=listFields)
+    after = cursorPattern.match(params.get('after')) if 'after' in params else None
+    try:
+        where, args = parseFilters(params, reserved=('limit', 'after', 'fields'))
+        if fields is None:
+            raise ValueError("fields 参数错误，可选字段: %s" % ','.join(newsFields))
+        if 'after' in params and after is None:
+            raise ValueError("after 参数格式错误，应为上一页返回的游标")
+    except ValueError as e:
+        return response(code=8400, result={
+            'type': "新闻筛选",
+            'data': str(e)
+        })
+
+    # 游标分页
+    if after is not None:
+        created, newsId = after.groups()
+        created = filterNumber(created)
+        where.append('(created < %s or (created = %s and id < %s))')
+        args += [created, created, int(newsId)]
+
+    # 拼接参数化sql
+    sql = 'select %s from news where %s order by created desc, id desc limit %%s' \
+          % (newsColumns(fields), ' and '.join(where))
+    args.append(int(limit))
 
-    # 拼接sql
-    sql = "select * from news where %s = %s" % (list(params.items())[0][0], list(params.items())[0][1])
+    # 执行sql
+    with DB() as db:
+        result = db.queryDB(sql=sql, args=args)
 
     # 返回数据
     return response(code=8200, result={
         'type': "新闻筛选",
-        'data': queryNews(sql=sql)
+        'limit': limit,
+        'fields': fields,
+        'after': newsCursor(result[-1]) if result else None,
+        'data': [newsDict(item, fields) for item in result]
+    })
+
+
+# 数据导出
+@api.route('/api/export', methods=['GET'])
+@generalTryCatch
+def export():
+    """
+    :param: since 可选, 发布时间 >= since
+    :param: until 可选, 发布时间 < until
+    :param: exchange 可选, 交易所/站点
+    :param: fields 可选, 返回字段，默认为全部字段
+    :return:            NDJSON，每行一条新闻，按发布时间正序
+    """
+
+    # 获取参数
+    params = flask.request.args
+    fields = parseFields(params, default=list(newsFields))
+    try:
+        if fields is None or set(params) - {'fields', 'since', 'until', 'exchange'}:
+            raise ValueError("只支持 since、until、exchange、fields 参数，可选字段: %s" % ','.join(newsFields))
+        where, args = parseFilters(params, reserved=('fields',)) if set(params) - {'fields'} else ([], [])
+    except ValueError as e:
+        return response(code=8400, result={
+            'type': "数据导出",
+            'data': str(e)
+        })
+
+    sql = 'select %s from news' % newsColumns(fields)
+    if where:
+        sql += ' where ' + ' and '.join(where)
+    sql += ' order by created, id'
+
+    # 逐行输出
+    def generate():
+        with DB() as db:
+            for item in db.streamDB(sql=sql, args=args):
+                yield json.dumps(newsDict(item, fields), ensure_ascii=False, default=str) + '\n'
+
+    return flask.Response(flask.stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# 全文检索
+@api.route('/api/search', methods=['GET'])
+@generalTryCatch
+@cached
+def search():
+    """
+    :param: q 必选, 检索词，匹配标题、摘要和正文
+    :param: exchange 可选, 交易所/站点
+    :param: lang 可选, 语言
+    :param: begin 可选, 从什么位置开始查询，默认为：0
+    :param: limit 可选, 查询多少条，默认为：10
+    :param: fields 可选, 返回字段，同新闻查询接口
+    :return:            按相关度排序
+    """
+
+    # 获取参数
+    params = flask.request.args
+    keyword = params.get('q', '').strip()
+    begin = params.get('begin', 0)
+    limit = params.get('limit', 10)
+    fields = parseFields(params, default=listFields)
+    if not keyword or fields is None:
+        return response(code=8400, result={
+            'type': "全文检索",
+            'data': "缺少 q 参数或 fields 参数错误，可选字段: %s" % ','.join(newsFields)
+        })
+
+    # FULLTEXT ngram 索引检索，按相关度排序
+    where, args = ['match(t.title, t.sub_title, t.content) against (%s)'], [keyword]
+    for key in ('exchange', 'lang'):
+        if params.get(key):
+            where.append('n.%s = %%s' % key)
+            args.append(params.get(key))
+    sql = 'select %s, match(t.title, t.sub_title, t.content) against (%%s) as score ' \
+          'from newsText t join news n on n.id = t.id where %s order by score desc limit %%s, %%s' \
+          % (newsColumns(fields, alias='n'), ' and '.join(where))
+    args = [keyword] + args + [int(begin), int(limit)]
+
+    # 执行sql
+    with DB() as db:
+        result = db.queryDB(sql=sql, args=args)
+
+    # 返回数据
+    return response(code=8200, result={
+        'type': "全文检索",
+        'q': keyword,
+        'begin': begin,
+        'limit': limit,
+        'fields': fields,
+        'data': [dict(newsDict(item, fields), score=float(item[-1])) for item in result]
     })
 
 
@@ -631,6 +1896,8 @@ class MUILTIPROCESS(object):
         # 定时任务
         sched = BlockingScheduler()
         sched.add_job(COLLECT().MAIN, CronTrigger.from_crontab(CONFIG.get('cron')), next_run_time=datetime.datetime.now())
+        # 失败重试
+        sched.add_job(COLLECT().RETRY, IntervalTrigger(seconds=CONFIG.get('retryInterval')))
         sched.start()
 
     # Flask 子进程
@@ -647,6 +1914,10 @@ class MUILTIPROCESS(object):
         :return:
         """
 
+        # 数据库迁移
+        with DB() as db:
+            db.migrate()
+
         # 定义进程池
         p = ProcessPoolExecutor(2)
 
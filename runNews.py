@@ -3,13 +3,29 @@ import os
 import time
 import datetime
 import requests
+import threading
+import queue
 import re
 import json
-from bs4 import BeautifulSoup
+import html
+import hashlib
+import itertools
+import asyncio
+import functools
+import collections
+import argparse
+from urllib.parse import urlparse, urljoin
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4 import FeatureNotFound
+import soupsieve
 import pymysql
 from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor as JobExecutor
 from apscheduler.triggers.cron import CronTrigger
-from concurrent.futures import ProcessPoolExecutor
+from apscheduler.triggers.interval import IntervalTrigger
+from concurrent.futures import ThreadPoolExecutor
 
 # 配置
 CONFIG = {
@@ -19,19 +35,100 @@ CONFIG = {
     },
     # 抓取最近几页（个别站点不支持）
     'latestPages': 3,
+    # 翻页模式: fixed 固定抓取 latestPages 页;
+    # auto 整页都已存储（或都早于库中最新新闻）时停止，停机后自动向后多翻直到遇到已存储的内容
+    'pageMode': 'auto',
+    # auto 模式最多翻多少页
+    'maxPages': 30,
 
     # 图片存放目录，可随意选择目录存放
     'imgDir': '../statics',
     # 图片url访问路径，需跟nginx配置保持一致
     'imgUrl': '/statics',
-    # 定时任务
+    # 定时任务，站点未单独配置 cron/interval 时使用
     'cron': '0 */1 * * 1-5',
+    # 每次触发随机延后最多多少秒，错开各站点同时发起请求
+    'jitter': 30,
+    # 错过触发时间多少秒内仍补跑一次（多次错过合并为一次）
+    'misfireGrace': 600,
+    # 同时抓取的站点数
+    'siteWorkers': 8,
+
+    # 失败重试：每隔多少秒检查一次，每次最多重试多少条
+    'retryInterval': 300,
+    'retryBatch': 50,
+    # 第一次重试等待多少秒，之后每次翻倍，最长等待多少秒，最多重试多少次
+    'retryBase': 300,
+    'retryMax': 86400,
+    'retryAttempts': 8,
+
+    # 历史回填：默认回填多少页，每个分段多少页，同时处理的分段数
+    'backfillPages': 3000,
+    'backfillChunk': 50,
+    'backfillWorkers': 4,
+
+    # 批量写入：缓冲达到多少条或距上次写入超过多少秒时写入数据库
+    'flushSize': 20,
+    'flushInterval': 30,
+    # 图片后台下载线程数及队列长度（队列满时抓取线程等待）
+    'imgWorkers': 4,
+    'imgQueueSize': 200,
+    # 去重缓存启动时预热最近多少条新闻地址，0为全部
+    'dedupWarm': 50000,
 
     # 网络请求重试次数
     'retry': 3,
-    # 反爬拦截之后等待时间（单位s）
+    # 连接超时、读取超时（单位s），每篇文章从开始请求到解析完成最多多少秒
+    'connectTimeout': 5,
+    'readTimeout': 20,
+    'articleDeadline': 60,
+    # 详情页对冲请求：耗时超过该域名最近请求耗时的分位数时再发一个相同请求，取先返回的结果
+    'hedge': False,
+    'hedgeQuantile': 0.95,
+    # 至少积累多少个耗时样本才开始对冲，最多保留多少个
+    'hedgeMinSamples': 20,
+    'hedgeSamples': 200,
+    # 反爬拦截之后等待时间（单位s），响应没有 Retry-After 时使用
     'wait': 2,
 
+    # 按域名自适应限速：初始每秒请求数，未单独配置的域名使用default
+    'rateLimit': {
+        'default': 4,
+        'theedgemalaysia.com': 4,
+        'www.moneycontrol.com': 4,
+        'hindi.moneycontrol.com': 4,
+        'gujarati.moneycontrol.com': 4,
+    },
+    # 速率上下限，正常响应约每秒加速多少，被限流时乘以多少，最多累积多少个令牌
+    'rateMin': 0.2,
+    'rateMax': 20,
+    'rateIncrease': 0.5,
+    'rateDecrease': 0.5,
+    'rateBurst': 4,
+    # 视为限流的状态码，Retry-After 最多等待多少秒
+    'throttleStatus': [403, 429, 503],
+    'retryAfterMax': 300,
+
+    # 异步抓取线程数（同一进程内所有站点共享）
+    'fetchWorkers': 16,
+    # 单个域名最大并发请求数，未单独配置的域名使用default
+    'hostConcurrency': {
+        'default': 4,
+        'theedgemalaysia.com': 4,
+        'www.moneycontrol.com': 4,
+        'hindi.moneycontrol.com': 4,
+        'gujarati.moneycontrol.com': 4,
+    },
+    # 每个域名连接池最少保留的keep-alive连接数（实际取该值与该域名并发上限的较大值）
+    'keepAlive': 4,
+
+    # HTML解析器: lxml（推荐，需安装lxml）或 html.parser（纯python，较慢）
+    'htmlParser': 'lxml',
+
+    # 列表页条件请求缓存（ETag/Last-Modified/内容哈希），列表未变化时跳过整页处理
+    'httpCache': True,
+    'httpCacheDir': './httpCache',
+
     # 抓取日志，分割flask日志，方便排查问题
     'logFile': 'spider.log',
     # 是否在屏幕同时打印抓取日志，True是，False否
@@ -43,10 +140,69 @@ CONFIG = {
     'mysqlDB': 'SRK',
     'mysqlUser': 'root',
     'mysqlPassword': 'Devops-Db;2021',
+
+    # mysql连接池：最大连接数，无可用连接时最多等待多少秒，空闲超过多少秒的连接复用前先检查
+    'mysqlPoolSize': 16,
+    'mysqlPoolTimeout': 10,
+    'mysqlPoolCheck': 30,
 }
 
 userAgent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
 
+# og:image，直接从源码提取，避免为一个meta标签解析整页
+ogImagePattern = re.compile(r'<meta\s[^>]*property=["\']og:image["\'][^>]*>', re.I)
+metaContentPattern = re.compile(r'content=["\']([^"\']*)["\']', re.I)
+
+# 详情页发布时间，如 Oct 10, 2025 10:00 AM，部分页面只有日期；月份可能为全称，上下午可能为小写
+createdPattern = r'[A-Z][a-z]+\s+\d{1,2},\s+\d{4}(?:\s+\d{1,2}:\d{2}\s+[AP]M)?'
+createdFormats = ('%b %d, %Y %I:%M %p', '%B %d, %Y %I:%M %p', '%b %d, %Y', '%B %d, %Y')
+
+# 反爬拦截页面（部分站点拦截时返回200）
+antiBotPattern = re.compile(r'cf-browser-verification|challenge-platform|Attention Required! \| Cloudflare|'
+                            r'<title>\s*(Access Denied|Just a moment\.\.\.)\s*</title>', re.I)
+
+# 数据库迁移，启动时依次执行，每条语句只执行一次，已存在的索引/表会被忽略
+MIGRATIONS = [
+    # 已存储新闻按源地址批量查询，与 runNews-flask.py 中的同一条迁移共用记录
+    'create index idx_news_source_url on news (source_url)',
+    # 数据版本号，新闻写入后递增，API据此失效响应缓存
+    'create table newsVersion (id tinyint primary key, version bigint not null default 0)',
+    'insert ignore into newsVersion (id, version) values (1, 0)',
+    # 新闻计数，按 交易所/站点 + 语言 在写入时累加，代替 count(id) 全表扫描
+    'create table newsCounter (exchange varchar(16) not null, lang varchar(16) not null, '
+    'total bigint not null default 0, primary key (exchange, lang))',
+    # 首次创建时按已有数据初始化，之后已存在的计数不会被覆盖
+    "insert ignore into newsCounter (exchange, lang, total) "
+    "select ifnull(exchange, ''), ifnull(lang, ''), count(*) from news group by ifnull(exchange, ''), ifnull(lang, '')",
+    # 全文检索：标题、摘要及去掉HTML标签的正文单独存放，ngram 分词同时支持中文、印地语、古吉拉特语和英文
+    'create table newsText (id bigint primary key, title text, sub_title text, content mediumtext) '
+    'engine=InnoDB default charset=utf8mb4',
+    "insert ignore into newsText (id, title, sub_title, content) "
+    "select id, title, sub_title, regexp_replace(content, '<[^>]*>', ' ') from news",
+    'create fulltext index ft_newsText on newsText (title, sub_title, content) with parser ngram',
+    # 各来源抓取进度：已衔接上的最新新闻、未完成的翻页位置、上次抓取时间，与新闻写入在同一事务中推进
+    # 历史回填的每个分段也记录一行，来源标识为 站点/起始页-结束页
+    'create table crawlState (source varchar(32) primary key, last_nid varchar(64), last_created double, '
+    'walk_cursor varchar(255), last_pass double)',
+    # 失败的新闻/图片：错误类型、重试次数、下次重试时间（为空时不再重试），由定时任务按指数退避重试
+    'create table newsRetry (source_url varchar(255) not null, kind varchar(8) not null, source varchar(32) not null, '
+    'entry text, error_class varchar(64), error text, attempts int not null default 0, next_attempt double, '
+    'created double, primary key (source_url, kind), key idx_next_attempt (next_attempt))',
+]
+
+
+# HTML标签
+htmlTagPattern = re.compile(r'<[^>]*>')
+
+
+# 去掉HTML标签，用于全文检索
+def plainText(source: str):
+    """
+    :param source:  HTML
+    :return:
+    """
+    return html.unescape(htmlTagPattern.sub(' ', source or ''))
+
 
 # 公共函数
 # 日志
@@ -97,749 +253,2349 @@ def download(fileName: str, url: str):
     return True
 
 
-# 执行网络请求func
-def doGET(url: str, headers: dict = None, urlType: str = None):
+# HTTP会话池
+class SESSIONS(object):
     """
-    :param urlType:  请求的url类型，用于判断是否为图片
-    :param url:    请求路径
-    :param headers:    请求头
-    :return:
+    按域名复用 requests.Session，保持keep-alive连接，避免每次请求重新握手
     """
 
-    # 基本参数配置
-    proxy = CONFIG.get('proxy')
+    # 域名 -> Session，进程内共享
+    sessions = {}
+    lock = threading.Lock()
 
-    # 预定义返回数据
-    res = None
-
-    # 请求接口
-    try:
-        if headers is not None:
-            res = requests.get(url=url, headers=headers, proxies=proxy)
-        else:
-            res = requests.get(url=url, proxies=proxy)
+    # 获取域名对应的会话
+    @classmethod
+    def get(cls, url: str):
+        """
+        :param url:     请求地址，用于提取域名
+        :return:
+        """
 
-    # 接口请求异常处理
-    except Exception as e:
-        LOG(msg="网络请求第一层异常捕获: %s" % e)
-        # 网络请求失败则重试几次
-        for i in range(CONFIG.get('retry')):
-            # 开始前先等待1s
-            time.sleep(CONFIG.get('wait'))
-            # 继续捕获重试异常
-            try:
-                res = requests.get(url=url, headers=headers, proxies=proxy)
-                # 请求成功则退出
-                if res is not None:
-                    break
-            # 重试的过程中如果仍然请求失败，直接忽略
-            except Exception as e:
-                LOG(msg="路径 [ %s ], %s" % (url, e))
-                pass
-        # 再次判断
-        if res is None:
-            LOG(msg="路径 [ %s ] 详情抓取失败，请重新运行程序"
-                    "或者联系管理员核实" % url)
-            exit(1)
+        host = urlparse(url).netloc
 
-    # 判断下载类型
-    if urlType is None:
-        return res.content.decode('utf-8')
-    # 如果为文件，则不进行解码
-    return res.content
+        with cls.lock:
+            if host not in cls.sessions:
+                # 连接池大小与该域名的并发上限保持一致，超出时阻塞等待空闲连接
+                limits = CONFIG.get('hostConcurrency')
+                size = max(limits.get(host, limits.get('default')), CONFIG.get('keepAlive'))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
 
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                # 默认请求头，单次请求传入的headers会与之合并
+                session.headers.update({'User-Agent': userAgent})
+                cls.sessions[host] = session
 
-# 判断图片是否已经下载
-def is_exists_img(imgName: str):
-    return os.path.exists(imgName)
+        return cls.sessions[host]
 
 
-# 数据库操作类
-class DB(object):
+# 网络请求失败
+class FETCHERROR(Exception):
     """
-    数据库操作类
+    网络请求失败，代替 exit(1) 返回给调用方
+    reason: timeout 超时，network 网络异常，throttled 多次被限流，deadline 超过文章截止时间
     """
 
-    # 日志前缀
-    prefix = '[ DB ]'
-
-    # 连接mysql
-    def __init__(self):
-
-        # 返回连接对象
-        self.db = pymysql.connect(
-            host=CONFIG.get('mysqlHost'),
-            user=CONFIG.get('mysqlUser'),
-            port=CONFIG.get('mysqlPort'),
-            password=CONFIG.get('mysqlPassword'),
-            database=CONFIG.get('mysqlDB'),
-        )
+    def __init__(self, url: str, reason: str, detail: str = ''):
+        super().__init__('[ %s ] %s %s' % (reason, url, detail))
+        self.url = url
+        self.reason = reason
 
-    # 查询数据库
-    def queryDB(self, sql: str):
-        """
-        :param sql:     查询语句
-        :return:
-        """
 
-        # 获取游标
-        cursor = self.db.cursor()
+# 当前线程正在处理的文章的截止时间，由 FETCHER 设置，at 为None时不限制
+DEADLINE = threading.local()
 
-        # 执行
-        try:
 
-            # 执行sql 获取结果
-            cursor.execute(sql)
-            result = cursor.fetchall()
+# 距文章截止时间的剩余秒数
+def remaining(url: str):
+    """
+    :param url:     请求地址，超时时用于报错
+    :return:        剩余秒数，没有截止时间时为None
+    """
 
-            # 提交事务关闭游标
-            self.db.commit()
-            cursor.close()
+    at = getattr(DEADLINE, 'at', None)
+    if at is None:
+        return None
+    left = at - time.time()
+    if left <= 0:
+        raise FETCHERROR(url=url, reason='deadline')
+    return left
 
-            return result
 
-        except Exception as e:
-            LOG(prefix=self.prefix, msg="[ 数据查询异常 ]: %s" % e)
-            self.db.commit()
-            cursor.close()
-            return False
+# 按域名自适应限速
+class RATELIMIT(object):
+    """
+    每个域名一个令牌桶，按 AIMD 调整速率：请求正常时缓慢加速，被限流（429/503/反爬页面）时减半
+    响应带 Retry-After 时在该时间之前暂停该域名的所有请求
+    """
 
-    # 通用插入方法
-    def insertDB(self, sql: str):
+    # 日志前缀
+    prefix = '[ RATELIMIT ]'
+    # 域名 -> {'rate': 每秒请求数, 'tokens': 可用令牌, 'time': 上次补充时间, 'until': 暂停到什么时候}
+    buckets = {}
+    lock = threading.Lock()
+
+    # 获取域名对应的令牌桶，调用方需持有锁
+    @classmethod
+    def bucket(cls, host: str):
         """
-        :param sql:     插入语句
+        :param host:    域名
         :return:
         """
 
-        # 获取游标
-        cursor = self.db.cursor()
-
-        try:
-            cursor.execute(sql)
-            self.db.commit()
-        except Exception as e:
-            LOG(prefix=self.prefix, msg="[ 数据写入异常 ]: %s" % e)
-
-        cursor.close()
+        if host not in cls.buckets:
+            rates = CONFIG.get('rateLimit')
+            cls.buckets[host] = {'rate': float(rates.get(host, rates.get('default'))),
+                                 'tokens': 1.0, 'time': time.time(), 'until': 0}
+        return cls.buckets[host]
 
-    # 保存抓取数据
-    def saveData(self, table: str, values: list):
+    # 请求前获取令牌，没有令牌时等待
+    @classmethod
+    def acquire(cls, url: str):
         """
-        :param table:   表名称
-        :param values:  值列表
+        :param url:     请求地址，用于提取域名
         :return:
         """
 
-        # 获取游标
-        cursor = self.db.cursor()
+        host = urlparse(url).netloc
+        while True:
+            with cls.lock:
+                bucket = cls.bucket(host)
+                now = time.time()
+                bucket['tokens'] = min(CONFIG.get('rateBurst'),
+                                       bucket['tokens'] + (now - bucket['time']) * bucket['rate'])
+                bucket['time'] = now
+
+                # 被限流暂停中，或令牌不足
+                wait = bucket['until'] - now
+                if wait <= 0:
+                    if bucket['tokens'] >= 1:
+                        bucket['tokens'] -= 1
+                        return
+                    wait = (1 - bucket['tokens']) / bucket['rate']
+
+            # 等待会超过文章截止时间时直接放弃
+            left = remaining(url)
+            if left is not None and wait >= left:
+                raise FETCHERROR(url=url, reason='deadline', detail='限速等待 %.1fs' % wait)
+
+            time.sleep(wait)
+
+    # 根据响应调整速率
+    @classmethod
+    def feedback(cls, url: str, res):
+        """
+        :param url:     请求地址
+        :param res:     响应对象
+        :return:        是否被限流，被限流时调用方应重试
+        """
 
-        # 列表生成式，生成正确的sql
-        sql = "INSERT INTO %s" \
-              "(title, sub_title, img, content, exchange, lang, source_url, created) " \
-              "VALUE (%s)" % (table, ','.join(["'%s'" % str(item) for item in values]))
+        throttled = cls.throttled(res)
+        host = urlparse(url).netloc
 
-        try:
-            cursor.execute(sql)
-            self.db.commit()
-        except Exception as e:
-            LOG(prefix=self.prefix, msg="[ 数据写入异常 ]: %s" % e)
+        with cls.lock:
+            bucket = cls.bucket(host)
 
-        cursor.close()
+            # 乘性减速，并按 Retry-After 暂停
+            if throttled:
+                bucket['rate'] = max(CONFIG.get('rateMin'), bucket['rate'] * CONFIG.get('rateDecrease'))
+                bucket['tokens'] = 0
+                bucket['until'] = max(bucket['until'], time.time() + cls.retryAfter(res))
+                rate = bucket['rate']
 
-    # 关闭连接
-    def closeDB(self):
-        """
-        :return:
-        """
-        self.db.close()
+            # 加性加速，约每秒增加 rateIncrease
+            else:
+                bucket['rate'] = min(CONFIG.get('rateMax'), bucket['rate'] + CONFIG.get('rateIncrease') / bucket['rate'])
 
+        if throttled:
+            LOG(prefix=cls.prefix, msg='[ %s ] 被限流 [ %d ]，速率降至 %.2f/s' % (host, res.status_code, rate))
 
-# 新闻采集类
-class ML(object):
-    """
-    马来西亚抓取类
-    """
-    # 基础参数
-    base_url = "https://theedgemalaysia.com/"
-    prefix = '[ ML ]'
-    # 配置headers
-    headers = {
-        'Referer': 'https://theedgemalaysia.com/',
-        'User-Agent': userAgent
-    }
+        return throttled
 
-    # 中文判断
-    def is_chinese(self, string: str):
+    # 判断响应是否为限流或反爬页面
+    @staticmethod
+    def throttled(res):
         """
-        :param string:   传入需要检测的字符串
+        :param res:     响应对象
         :return:
         """
-        # 循环字符串，只要存在一个中文则判定为中文
-        for char in string:
-            if '\u0e00' <= char <= '\u9fa5':
-                return True
+
+        if res.status_code in CONFIG.get('throttleStatus'):
+            return True
+
+        # 部分站点拦截时仍返回200，只检查html页面开头
+        if 'html' in res.headers.get('Content-Type', ''):
+            return antiBotPattern.search(res.content[:4096].decode('utf-8', 'ignore')) is not None
         return False
 
-    # 核心抓取函数
-    def spider(self):
+    # 解析 Retry-After，秒数或HTTP日期，没有时使用默认等待时间
+    @staticmethod
+    def retryAfter(res):
         """
-        :return:
+        :param res:     响应对象
+        :return:        需要等待的秒数
         """
 
-        # 获取mysql对象
-        db = DB()
-        # 每页条数
-        limit = 10
-
-        # 循环页数
-        for page in range(CONFIG.get('latestPages')):
-
-            # 定义offset: 从第几条开始查询
-            offset = page * limit
-            # 获取需要抓取的新闻列表
-            News = json.loads(self.getNeswIndex(offset=offset))['results']
-            # 循环新闻列表
-            for new in News:
-                # 拼接新闻源地址
-                sourceUrl = 'https://theedgemalaysia.com/node/%s' % new['nid']
+        value = (res.headers.get('Retry-After') or '').strip()
+        if value.isdigit():
+            return min(float(value), CONFIG.get('retryAfterMax'))
+        try:
+            return min(max(0, parsedate_to_datetime(value).timestamp() - time.time()), CONFIG.get('retryAfterMax'))
+        except Exception:
+            return CONFIG.get('wait')
 
-                # 判断数据库中是否已经存储该新闻或者新闻是否为英文
-                if not self.is_chinese(string=new['title']) or \
-                        db.queryDB(sql='select source_url from news where source_url = "%s"' % sourceUrl) != ():
-                    # 如果存在或者是英文直接跳过该新闻
-                    continue
+    # 各域名当前速率
+    @classmethod
+    def rates(cls):
+        """
+        :return:    域名 -> 每秒请求数
+        """
 
-                # 定义需要存储的预数据
-                values = [new['title'].replace('\'', '"'), new['summary'].replace('\'', '"')]
-
-                # 下载图片
-                # 判断该新闻有无图片
-                if new['img'] != '':
-                    imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), new['nid'])
-                    # 判断该新闻的图片是否由其它语言已经下载过，
-                    if is_exists_img(imgName) is False:
-                        # 判断图片是否下载成功
-                        if not download(fileName=imgName, url=new['img']):
-
-                            saveStatus = False
-                            # 如果未成功下载则重试两次
-                            for i in range(CONFIG.get('retry')):
-                                saveStatus = download(fileName=imgName, url=new['img'])
-                                if saveStatus:
-                                    break
-                            # 判断最终图片是否保存成功
-                            if not saveStatus:
-                                LOG(prefix=self.prefix, msg="文章 [ %s ] 中的图片下载失败，请重新运行程序"
-                                                            "或者联系管理员核实" % new['source_url'])
-                                exit(1)
-
-                    # 组装图片数据
-                    values.append('%s/%s.jpg' % (CONFIG.get('imgUrl'), new['nid']))
-
-                # 如果不存在图片
-                else:
-                    # 组装图片数据
-                    values.append('')
+        with cls.lock:
+            return {host: round(bucket['rate'], 2) for host, bucket in cls.buckets.items()}
 
-                # 文章详情抓取
-                content = self.getNewsDetails(path='node/%s' % new['nid']).replace('\'', '"')
 
-                # 组装文章详情
-                values.append(content)
-                values.append('ml')
-                values.append(new['language'])
-                values.append(sourceUrl)
-                values.append(new['created'] / 1000)
+# 执行网络请求func
+def doGET(url: str, headers: dict = None, urlType: str = None):
+    """
+    :param urlType:  请求的url类型，用于判断是否为图片
+    :param url:    请求路径
+    :param headers:    请求头
+    :return:
+    """
 
-                # 插入mysql
-                db.saveData(table='news', values=values)
+    # 获取响应
+    res = doRequest(url=url, headers=headers)
 
-            # 日志提示
-            LOG(prefix=self.prefix, msg="第 [ %d ] 页抓取完成" % (page + 1))
+    # 判断下载类型
+    if urlType is None:
+        return res.content.decode('utf-8')
+    # 如果为文件，则不进行解码
+    return res.content
 
-        # 关闭数据库连接
-        db.closeDB()
 
-    # 文章页处理
-    def getNewsDetails(self, path: str):
-        """
-        :param path:      文章页面路径
-        :return:
-        """
+# 发送网络请求，返回响应对象
+def doRequest(url: str, headers: dict = None):
+    """
+    :param url:    请求路径
+    :param headers:    请求头
+    :return:
+    """
 
-        # 请求获取页面数据
-        page_source = doGET(url=self.base_url + path, headers=self.headers)
+    # 基本参数配置
+    proxy = CONFIG.get('proxy')
 
-        # 判断数据是否正确
-        if isinstance(page_source, dict):
-            return False
+    # 获取该域名的复用会话
+    session = SESSIONS.get(url)
 
-        # 实例BS
-        soup = BeautifulSoup(page_source, features="lxml")
+    # 请求接口，失败或被限流时重试几次
+    reason = 'network'
+    for i in range(CONFIG.get('retry') + 1):
 
-        # 提取文章详情的核心主体
-        pattern = re.compile(r'news-detail_newsTextDataWrap*')  # 正则模糊匹配
-        newsBody = soup.find("div", attrs={"class": pattern})
+        # 按该域名当前速率取得令牌，被限流时等到 Retry-After 之后
+        RATELIMIT.acquire(url)
 
-        # 删除广告
-        if newsBody.find("div", attrs={"class": "inPageAd"}) is not None:
-            newsBody.find("div", attrs={"class": "inPageAd"}).decompose()
+        # 读取超时不超过文章剩余时间
+        left = remaining(url)
+        readTimeout = CONFIG.get('readTimeout') if left is None else min(CONFIG.get('readTimeout'), left)
 
-        # 删除底部英文链接
-        if newsBody.find("em") is not None and 'version' in newsBody.find("em").text:
-            newsBody.find("em").decompose()
-            if newsBody.find("a") is not None:
-                newsBody.find("a").decompose()
-            newsBody.find_all("div", attrs={"class": "newsTextDataWrapInner"})[-1].decompose()
+        try:
+            res = session.get(url=url, headers=headers, proxies=proxy,
+                              timeout=(CONFIG.get('connectTimeout'), readTimeout))
 
-        # 返回最终数据
-        return str(newsBody.contents[0])
+        # 超时或网络异常，等待后重试
+        except Exception as e:
+            reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'network'
+            LOG(msg="路径 [ %s ], %s" % (url, e))
+            left = remaining(url)
+            time.sleep(CONFIG.get('wait') if left is None else min(CONFIG.get('wait'), left))
+            continue
 
-    # 中文新闻列表
-    def getNeswIndex(self, offset: int = 0):
-        """
-        :param offset:      起始位置, 默认为0, 也就是从最新的一条新闻开始获取
-        :return:
-        """
+        # 被限流或反爬拦截的响应不作为结果返回
+        if RATELIMIT.feedback(url, res):
+            reason = 'throttled'
+            continue
 
-        # 定义接口path
-        path = 'api/loadMoreCategories?offset=%d&categories=news' % offset
+        return res
 
-        # 执行请求
-        return doGET(url=self.base_url + path, headers=self.headers)
+    raise FETCHERROR(url=url, reason=reason, detail='重试 %d 次后仍失败' % CONFIG.get('retry'))
 
 
-# 马来西亚英文站新闻采集类
-class MLEN(object):
+# 列表页条件请求缓存
+class HTTPCACHE(object):
     """
-    马来西亚英文站新闻采集类
+    按url在磁盘记录 ETag / Last-Modified / 内容哈希，列表页未变化时返回None
+    页面处理完成后调用 commit 才会落盘，处理中断的页面下次仍会重新处理
     """
-    # 基础参数
-    base_url = "https://theedgemalaysia.com/"
-    prefix = '[ ML-EN ]'
-    # 配置headers
-    headers = {
-        'Referer': 'https://theedgemalaysia.com/',
-        'User-Agent': userAgent,
-        'Accept-Language': 'en',
-    }
 
-    # 文章页处理
-    def getNewsDetails(self, path: str):
+    # 日志前缀
+    prefix = '[ HTTPCACHE ]'
+    # 已请求但尚未落盘的缓存信息: url -> meta
+    pending = {}
+    lock = threading.Lock()
+
+    # 缓存文件路径
+    @classmethod
+    def path(cls, url: str):
         """
-        :param path:      文章页面路径
+        :param url:     请求地址
         :return:
         """
+        return os.path.join(CONFIG.get('httpCacheDir'), '%s.json' % hashlib.sha1(url.encode('utf-8')).hexdigest())
 
-        # 请求获取页面数据
-        page_source = doGET(url=self.base_url + path, headers=self.headers)
-
-        # 判断数据是否正确
-        if isinstance(page_source, dict):
-            return False
-
-        # 实例BS
-        soup = BeautifulSoup(page_source, features="lxml")
-
-        # 提取文章详情的核心主体
-        pattern = re.compile(r'news-detail_newsTextDataWrap*')  # 正则模糊匹配
-        newsBody = soup.find("div", attrs={"class": pattern})
-
-        # 删除广告
-        if newsBody.find("div", attrs={"class": "inPageAd"}) is not None:
-            newsBody.find("div", attrs={"class": "inPageAd"}).decompose()
-
-        # 删除底部英文链接
-        if newsBody.find("em") is not None and 'version' in newsBody.find("em").text:
-            newsBody.find("em").decompose()
-            if newsBody.find("a") is not None:
-                newsBody.find("a").decompose()
-            newsBody.find_all("div", attrs={"class": "newsTextDataWrapInner"})[-1].decompose()
-
-        # 返回最终数据
-        return str(newsBody.contents[0])
-
-    # 英文新闻列表
-    def getNeswIndex(self, offset: int = 0):
+    # 读取缓存信息
+    @classmethod
+    def load(cls, url: str):
         """
-        :param offset:      起始位置, 默认为0, 也就是从最新的一条新闻开始获取
+        :param url:     请求地址
         :return:
         """
 
-        # 定义接口path
-        path = 'api/loadMoreCategories?offset=%s&categories=malaysia' % offset
+        try:
+            with open(cls.path(url), 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    # 条件请求
+    @classmethod
+    def get(cls, url: str, headers: dict = None):
+        """
+        :param url:         请求地址
+        :param headers:     请求头
+        :return:            页面内容，未变化时返回None
+        """
+
+        # 未开启缓存直接请求
+        if not CONFIG.get('httpCache'):
+            return doGET(url=url, headers=headers)
+
+        # 带上上次的校验信息
+        meta = cls.load(url)
+        headers = dict(headers or {})
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta.get('etag')
+        if meta.get('lastModified'):
+            headers['If-Modified-Since'] = meta.get('lastModified')
+
+        res = doRequest(url=url, headers=headers)
+
+        # 服务端确认未变化
+        if res.status_code == 304:
+            return None
+
+        # 服务端不支持条件请求时，按内容哈希判断
+        digest = hashlib.sha1(res.content).hexdigest()
+        with cls.lock:
+            cls.pending[url] = {
+                'etag': res.headers.get('ETag'),
+                'lastModified': res.headers.get('Last-Modified'),
+                'hash': digest,
+            }
+        if digest == meta.get('hash'):
+            return None
 
-        # 执行请求
-        return doGET(url=self.base_url + path, headers=self.headers)
+        return res.content.decode('utf-8')
 
-    # 核心抓取函数
-    def spider(self):
+    # 页面处理完成，缓存信息落盘
+    @classmethod
+    def commit(cls, url: str):
         """
+        :param url:     请求地址
         :return:
         """
 
-        # 获取mysql对象
-        db = DB()
-        # 每页条数
-        limit = 10
-
-        # 循环页数
-        for page in range(CONFIG.get('latestPages')):
+        with cls.lock:
+            meta = cls.pending.pop(url, None)
+        if meta is None:
+            return
 
-            # 定义offset: 从第几条开始查询
-            offset = page * limit
-            # 获取需要抓取的新闻列表
-            News = json.loads(self.getNeswIndex(offset=offset))['results']
-            # 循环新闻列表
-            for new in News:
-                # 拼接新闻源地址
-                sourceUrl = 'https://theedgemalaysia.com/node/%s' % new['nid']
-                # # 判断数据库中是否已经存储该新闻或者新闻是否为英文
-                if db.queryDB(sql='select source_url from news where source_url = "%s"' % sourceUrl) != ():
-                    # 如果存在或者是英文直接跳过该新闻
-                    continue
+        try:
+            os.makedirs(CONFIG.get('httpCacheDir'), exist_ok=True)
+            with open(cls.path(url), 'w') as f:
+                json.dump(meta, f)
+        except Exception as e:
+            LOG(prefix=cls.prefix, msg="缓存写入失败 [ %s ]: %s" % (url, e))
 
-                # 定义需要存储的预数据
-                values = [new['title'].replace('\'', '"'), new['summary'].replace('\'', '"')]
-
-                # 下载图片
-                # 判断该新闻有无图片
-                if new['img'] != '':
-                    imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), new['nid'])
-                    # 判断该新闻的图片是否由其它语言已经下载过，
-                    if is_exists_img(imgName) is False:
-                        # 判断图片是否下载成功
-                        if not download(fileName=imgName, url=new['img']):
-
-                            saveStatus = False
-                            # 如果未成功下载则重试两次
-                            for i in range(CONFIG.get('retry')):
-                                saveStatus = download(fileName=imgName, url=new['img'])
-                                if saveStatus:
-                                    break
-                            # 判断最终图片是否保存成功
-                            if not saveStatus:
-                                LOG(prefix=self.prefix, msg="文章 [ %s ] 中的图片下载失败，请重新运行程序"
-                                                            "或者联系管理员核实" % new['source_url'])
-                                exit(1)
-
-                    # 组装图片数据
-                    values.append('%s/%s.jpg' % (CONFIG.get('imgUrl'), new['nid']))
-
-                # 如果不存在图片
-                else:
-                    # 组装图片数据
-                    values.append('')
 
-                # 文章详情抓取
-                content = self.getNewsDetails(path='node/%s' % new['nid']).replace('\'', '"')
+# HTML解析
+def parseHTML(source, parseOnly: SoupStrainer = None):
+    """
+    :param source:      页面源码
+    :param parseOnly:   只解析匹配的节点
+    :return:
+    """
 
-                # 组装文章详情
-                values.append(content)
-                values.append('ml')
-                values.append(new['language'])
-                values.append(sourceUrl)
-                values.append(new['created'] / 1000)
+    try:
+        return BeautifulSoup(source, features=CONFIG.get('htmlParser'), parse_only=parseOnly)
+    # 未安装lxml时退回内置解析器
+    except FeatureNotFound:
+        return BeautifulSoup(source, features='html.parser', parse_only=parseOnly)
 
-                # 插入mysql
-                db.saveData(table='news', values=values)
 
-                # 日志提示
-            LOG(prefix=self.prefix, msg="第 [ %d ] 页抓取完成" % (page + 1))
+# 从源码提取 og:image
+def ogImage(source: str):
+    """
+    :param source:      页面源码
+    :return:            图片地址，不存在时为空字符串
+    """
 
-        # 关闭数据库连接
-        db.closeDB()
+    meta = ogImagePattern.search(source)
+    if meta is None:
+        return ''
+    content = metaContentPattern.search(meta.group(0))
+    if content is None:
+        return ''
+    return html.unescape(content.group(1))
 
 
-# 印度新闻采集类
-class IDX(object):
+# 从文本中提取发布时间，带时刻的优先，同类取最后一个
+def parseCreated(text: str, pattern, formats: tuple):
     """
-    印度抓取类
+    :param text:        发布时间所在节点的文本，如 "Updated Oct 10, 2025 10:00 AM"、"first published: Oct 10, 2025 09:00 am"
+    :param pattern:     时间的正则
+    :param formats:     时间格式，按顺序尝试
+    :return:            时间戳，没有符合格式的时间时抛出 ValueError
     """
-    # 基础参数
-    base_url = {
-        "gujarati": "https://gujarati.moneycontrol.com",
-        "en": "https://www.moneycontrol.com",
-        "hindi": "https://hindi.moneycontrol.com"
-    }
-    prefix = '[ IDX ]'
 
-    # 获取新闻列表
-    def getNeswIndex(self, lang: str, page: int = 0):
-        """
-        :param lang:       抓取的语音类型
-        :param page:      第几页
-        :return:
-        """
+    matches = [' '.join(item.split()) for item in pattern.findall(text)]
+    for dateStr in sorted(reversed(matches), key=lambda item: ':' not in item):
+        for dateFormat in formats:
+            try:
+                return datetime.datetime.strptime(dateStr, dateFormat).timestamp()
+            except ValueError:
+                continue
+    raise ValueError('未找到发布时间: %s' % ' '.join(text.split())[:100])
 
-        # 定义接口path
-        path = '/news/latest-news/page-%d' % page
-        if lang == 'en':
-            path = '/news/news-all/page-%d' % page
 
-        # 根据语言选择Referer请求头
-        headers = {
-            'Referer': self.base_url[lang],
-            'User-Agent': userAgent
-        }
+# 判断图片是否已经下载
+def is_exists_img(imgName: str):
+    return os.path.exists(imgName)
 
-        # 执行请求
-        res = doGET(url=self.base_url[lang] + path, headers=headers)
 
-        # 定义文章列表
-        newsList = []
+# 翻页控制
+def nextPage(page: int, fresh: int, newest: float = None, watermark: float = None, resume: int = None):
+    """
+    :param page:        刚处理完的页码，从0开始
+    :param fresh:       本页未处理过的新闻条数，按未经 accept 过滤的列表计算
+    :param newest:      本页最新一条新闻的发布时间戳，列表不带时间时为None
+    :param watermark:   上次完整抓取衔接上的最新发布时间戳，没有记录时为None
+    :param resume:      上次中断前已处理完的页码，没有中断时为None
+    :return:            是否继续抓取下一页
+    """
 
-        # 提取新闻map映射函数
-        def bodyNewsMap(item):
-            return item.find("a").attrs.get('href')
+    # 固定页数
+    if CONFIG.get('pageMode') != 'auto':
+        return page + 1 < CONFIG.get('latestPages')
 
-        # 清洗数据
-        soup = BeautifulSoup(res, features='lxml')
+    # 越过上次中断的页之前不判断是否衔接，中断后列表上新增的新闻会把未处理的新闻推到后面
+    if resume is not None and page <= resume:
+        return page + 1 < CONFIG.get('maxPages')
 
-        # 再次判断语言类型
-        if lang == 'en':
-            # 提取新闻列表DOM
-            bodyNewsDom = soup.find("ul", attrs={"id": "cagetory"})
-            bodyNewsDom = bodyNewsDom.find_all("h2")
+    # 整页都已存储，或整页都早于上次衔接上的最新新闻，说明已经衔接上
+    if fresh == 0:
+        return False
+    if newest is not None and watermark is not None and newest < watermark:
+        return False
 
-            # 执行提取映射
-            bodyNews = list(map(bodyNewsMap, bodyNewsDom))
+    return page + 1 < CONFIG.get('maxPages')
 
-        # 其他两种语言处理逻辑
-        else:
-            # 顶部第一条新闻
-            try:
-                topNews = soup.find("h2", attrs={"class": "topNews_h2"}).find("a").attrs.get('href')
-                newsList.append(topNews)
-            # 如果不存在头部新闻，则跳过
-            except Exception:
-                pass
 
-            # 主体新闻列表
-            pattern = re.compile(r'Category_cat-inn*')
-            bodyNewsDom = soup.find_all("div", attrs={"class": pattern})
+# 异步抓取引擎
+class FETCHER(object):
+    """
+    异步抓取引擎：列表页之后并发抓取详情页，按域名限制并发数
+    """
 
-            # 执行提取映射
-            bodyNews = list(map(bodyNewsMap, bodyNewsDom))
+    # 日志前缀
+    prefix = '[ FETCHER ]'
+    # 进程内共享的线程池，首次使用时创建
+    executor = None
+    lock = threading.Lock()
+    # 域名 -> 最近成功请求的耗时，用于计算对冲请求的触发时间
+    latency = {}
+
+    def __init__(self, deadline: float = None, hedge: bool = False):
+        """
+        :param deadline:    每个任务最多执行多少秒，None 不限制
+        :param hedge:       是否对慢任务发起对冲请求
+        """
 
-        # 返回新闻列表
-        return newsList + bodyNews
+        # 域名信号量，必须在事件循环内创建
+        self.semaphores = {}
+        # 仍在线程中执行的请求
+        self.running = set()
+        self.deadline = deadline
+        self.hedge = hedge
 
-    # 详情页处理
-    def getNewsDetails(self, lang: str, path: str):
+    # 获取线程池
+    @classmethod
+    def pool(cls):
         """
-        :param lang:     抓取的语音类型
-        :param path:    具体新闻路径
         :return:
         """
-        # 根据语言选择Referer请求头
-        headers = {
-            'Referer': self.base_url[lang],
-            'User-Agent': userAgent
-        }
-        # 获取详情页DOM结构
-        if lang == 'en':
-            res = doGET(url=path, headers=headers)
-        else:
-            res = doGET(url=self.base_url[lang] + path, headers=headers)
-
-        # 清洗数据
-        soup = BeautifulSoup(res, 'lxml')
-
-        # 再次判断语言，处理详情页特殊情况
-        if lang == 'en':
-
-            lft_body = soup.find("div", attrs={"class": "page_left_wrapper"})
-            # 英文页主体
-            context = lft_body.find("div", attrs={"id": "contentdata"})
-            # 剔除广告
-            for item in context.find_all("div"):
-                item.decompose()
-            # 提取发布时间
-
-            date_str = re.split(r': ', lft_body.find("div", attrs={"class": "tags_last_line"}).text)[-1].strip()
-
-        # 其他两种语言
-        else:
-            lft_body = soup.find("div", attrs={"class": "lft-side"})
-
-            # 正则匹配文章详情主体
-            pattern = re.compile(r'Article_body*')
-            context = lft_body.find("div", attrs={"class": pattern})
-            # 剔除广告
-            if context.find("aside") is not None:
-                context.find("aside").decompose()
-            if context.find("a") is not None:
-                context.find("a").parent.parent.decompose()
-            # 剔除外围多余标签
-            context = context.contents[0]
 
-            # 提取发布时间
-            pattern = re.compile(r'Tag_author_rgt*')
-            date_str = re.split(r'[<>]', str(lft_body.find("div", attrs={"class": pattern}).find_all("p")[-1]))[-3]
-
-        # 获取文章标题和子标体
-        title = lft_body.find('h1').text
-        sub_title = lft_body.find('h2').text
-        # 获取图片链接
-        img_url = ''
-        if soup.find("meta", attrs={"property": "og:image"}) is not None:
-            img_url = soup.find("meta", attrs={"property": "og:image"}).attrs.get('content')
-        # 通用时间戳转换
-        dateStamp = datetime.datetime.strptime(date_str.strip(), '%b %d, %Y %I:%M %p').timestamp()
-        # 剔除JS文件
-        if context.find("script") is not None:
-            context.find("script").decompose()
-
-        # 返回
-        return {
-            'title': title,
-            'sub_title': sub_title,
-            'img': img_url,
-            'content': str(context),
-            'created': dateStamp,
-            'exchange': 'id',
-            'lang': lang,
-            'source_url': self.base_url[lang] + path if lang != 'en' else path  # 处理英文站路径包含域名的情况
-        }
+        with cls.lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(CONFIG.get('fetchWorkers'))
+        return cls.executor
 
-    # 核心抓取函数
-    def spider(self):
+    # 获取域名对应的信号量
+    def semaphore(self, url: str):
         """
+        :param url:     请求地址，用于提取域名
         :return:
         """
 
-        # 获取mysql对象
-        db = DB()
+        host = urlparse(url).netloc
+        if host not in self.semaphores:
+            limits = CONFIG.get('hostConcurrency')
+            self.semaphores[host] = asyncio.Semaphore(limits.get(host, limits.get('default')))
+        return self.semaphores[host]
 
-        # 循环页数
-        for page in range(CONFIG.get('latestPages')):
+    # 记录请求耗时
+    @classmethod
+    def record(cls, url: str, seconds: float):
+        """
+        :param url:     请求地址，用于提取域名
+        :param seconds: 耗时
+        :return:
+        """
 
-            # 循环3种语言
-            for lang, _ in self.base_url.items():
+        host = urlparse(url).netloc
+        with cls.lock:
+            if host not in cls.latency:
+                cls.latency[host] = collections.deque(maxlen=CONFIG.get('hedgeSamples'))
+            cls.latency[host].append(seconds)
 
-                # 获取需要抓取的新闻列表
-                newsList = self.getNeswIndex(lang=lang, page=page + 1)
+    # 对冲请求的触发时间，样本不足时为None
+    @classmethod
+    def hedgeDelay(cls, url: str):
+        """
+        :param url:     请求地址，用于提取域名
+        :return:
+        """
 
-                # 循环新闻列表
-                for newPath in newsList:
+        with cls.lock:
+            samples = sorted(cls.latency.get(urlparse(url).netloc, []))
+        if len(samples) < CONFIG.get('hedgeMinSamples'):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * CONFIG.get('hedgeQuantile')))]
 
-                    # 处理新闻直播和每日汇总，收费新闻，拍卖等情况
-                    if bool(re.search(re.compile(r'news-live|moneycontrol-daily|news/videos|news/cricket'), newPath)):
-                        continue
+    # 在线程中执行任务，期间设置文章截止时间
+    @staticmethod
+    def call(func, kwargs: dict, at: float):
+        """
+        :param func:    实际执行的函数
+        :param kwargs:  func 的参数
+        :param at:      截止时间戳，None 不限制
+        :return:
+        """
 
-                    # 获取当前新闻的核心数据
-                    # 通用特殊新闻处理
-                    try:
-                        new = self.getNewsDetails(lang=lang, path=newPath)
-                    except Exception:
-                        LOG(prefix=self.prefix, msg='[ %s ] 已跳过该类非正常新闻 [ %s ]' % (lang, newPath))
-                        continue
+        DEADLINE.at = at
+        try:
+            return func(**kwargs)
+        finally:
+            DEADLINE.at = None
 
-                    # 拼接图片存储名称
-                    imgNameBody = 'idx_%s' % re.split(r'[.-]', new.get('source_url'))[-2]
+    # 请求线程结束，释放其占用的域名并发名额
+    def finished(self, semaphore: asyncio.Semaphore, future: asyncio.Future):
+        """
+        :param semaphore:   请求所属域名的信号量
+        :param future:      请求线程对应的future
+        :return:
+        """
 
-                    # 判断数据库中是否已经存储该新闻或者新闻是否为英文
-                    if db.queryDB(
-                            sql='select source_url from news where source_url = "%s"' % new.get('source_url')) != ():
-                        # 如果存在直接跳过该新闻
-                        continue
+        self.running.discard(future)
+        semaphore.release()
+        # 落后的对冲请求结果不再使用，取出异常避免未处理异常的警告
+        if not future.cancelled():
+            future.exception()
 
-                    # 定义需要存储的预数据
-                    values = [new['title'].replace('\'', '"'), new['sub_title'].replace('\'', '"')]
-
-                    # 下载图片
-                    # 判断该新闻有无图片
-                    if new['img'] != '':
-                        imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), imgNameBody)
-                        # 判断图片是否下载成功
-                        if not download(fileName=imgName, url=new['img']):
-
-                            saveStatus = False
-                            # 如果未成功下载则重试两次
-                            for i in range(CONFIG.get('retry')):
-                                saveStatus = download(fileName=imgName, url=new['img'])
-                                if saveStatus:
-                                    break
-                            # 判断最终图片是否保存成功
-                            if not saveStatus:
-                                LOG(prefix=self.prefix, msg="文章 [ %s ] 中的图片下载失败，请重新运行程序"
-                                                            "或者联系管理员核实" % new['source_url'])
-                                exit(1)
-
-                        # 组装图片数据
-                        values.append('%s/%s.jpg' % (CONFIG.get('imgUrl'), imgNameBody))
-
-                    # 如果不存在图片
-                    else:
-                        # 组装图片数据
-                        values.append('')
+    # 执行单个任务
+    async def fetch(self, url: str, func, kwargs: dict):
+        """
+        :param url:     请求地址
+        :param func:    实际执行的函数，如各站点的 getNewsDetails
+        :param kwargs:  func 的参数
+        :return:
+        """
 
-                    # 文章详情抓取
-                    content = new.get('content').replace('\'', '"')
+        semaphore = self.semaphore(url)
+        loop = asyncio.get_running_loop()
+
+        # 每个请求线程占用一个域名并发名额，直到线程结束才释放
+        # 线程无法中断，对冲中落后的请求不取消，同样占用名额直到结束
+        def start():
+            future = loop.run_in_executor(self.pool(), call)
+            self.running.add(future)
+            future.add_done_callback(functools.partial(self.finished, semaphore))
+            return future
+
+        await semaphore.acquire()
+        beginTime = time.time()
+        call = functools.partial(self.call, func, kwargs,
+                                 beginTime + self.deadline if self.deadline is not None else None)
+        futures = [start()]
+
+        # 超过该域名耗时分位数仍未返回时，域名还有空闲名额则再发一个相同请求
+        delay = self.hedgeDelay(url) if self.hedge else None
+        if delay is not None:
+            done, pending = await asyncio.wait(futures, timeout=delay)
+            if not done and not semaphore.locked():
+                await semaphore.acquire()
+                futures.append(start())
+
+        # 取先成功的结果，都失败时返回最后一个异常
+        error = None
+        for future in asyncio.as_completed(futures):
+            try:
+                result = await future
+            except Exception as e:
+                error = e
+                continue
+            self.record(url, time.time() - beginTime)
+            return result
+        raise error
 
-                    # 组装文章详情
-                    values.append(content)
-                    values.append(new.get('exchange'))
-                    values.append(new.get('lang'))
-                    values.append(new.get('source_url'))
-                    values.append(new.get('created'))
+    # 并发执行一批任务
+    def gather(self, jobs: list):
+        """
+        :param jobs:    任务列表，每项为 (url, func, kwargs)
+        :return:        结果列表，顺序与jobs一致，出错的任务对应位置为异常对象
+        """
 
-                    # 插入mysql
-                    db.saveData(table='news', values=values)
+        if not jobs:
+            return []
 
-                # 日志提示
-                LOG(prefix=self.prefix, msg="[ %s ] 第 [ %d ] 页抓取完成" % (lang, page + 1))
+        async def main():
+            self.semaphores = {}
+            self.running = set()
+            results = await asyncio.gather(*[self.fetch(url, func, kwargs) for url, func, kwargs in jobs],
+                                           return_exceptions=True)
+            # 等待落后的对冲请求结束，请求线程不会在本批次的并发限制之外继续执行
+            if self.running:
+                await asyncio.wait(list(self.running))
+            return results
 
-        # 关闭数据库连接
-        db.closeDB()
+        return asyncio.run(main())
 
 
-# 多进程类
-class SPIDER(object):
+# 图片后台下载
+class IMAGES(object):
+    """
+    图片下载队列，文章先行入库，图片由后台线程下载完成后回填 img 字段
+    """
 
-    # 马来西亚抓取进程
-    def ml(self):
+    # 日志前缀
+    prefix = '[ IMAGES ]'
+    # 下载队列，首次提交时创建并启动下载线程
+    queue = None
+    lock = threading.Lock()
+
+    # 启动下载线程
+    @classmethod
+    def start(cls):
         """
         :return:
         """
 
-        # 定时任务
-        sched = BlockingScheduler()
-        # 中文站
-        sched.add_job(ML().spider, CronTrigger.from_crontab(CONFIG.get('cron')), next_run_time=datetime.datetime.now())
-        # 英文站
-        sched.add_job(MLEN().spider, CronTrigger.from_crontab(CONFIG.get('cron')),
-                      next_run_time=datetime.datetime.now())
-        sched.start()
+        with cls.lock:
+            if cls.queue is None:
+                cls.queue = queue.Queue(maxsize=CONFIG.get('imgQueueSize'))
+                for i in range(CONFIG.get('imgWorkers')):
+                    threading.Thread(target=cls.worker, name='img-%d' % i, daemon=True).start()
 
-    # 印度抓取进程
-    def idx(self):
+    # 提交下载任务
+    @classmethod
+    def submit(cls, sourceUrl: str, url: str, fileName: str, imgPath: str):
         """
+        :param sourceUrl:   新闻源地址，用于回填数据
+        :param url:         图片下载地址
+        :param fileName:    图片保存路径
+        :param imgPath:     图片访问路径，写入 img 字段
         :return:
         """
 
-        # 定时任务
-        sched = BlockingScheduler()
-        sched.add_job(IDX().spider, CronTrigger.from_crontab(CONFIG.get('cron')), next_run_time=datetime.datetime.now())
-        sched.start()
+        cls.start()
+        cls.queue.put((sourceUrl, url, fileName, imgPath))
 
-    # 进程池调度
-    def run(self):
+    # 下载线程
+    @classmethod
+    def worker(cls):
         """
         :return:
         """
 
-        # 定义进程池
-        p = ProcessPoolExecutor(2)
+        while True:
+            sourceUrl, url, fileName, imgPath = cls.queue.get()
+            error = None
 
-        # 加入任务
-        p.submit(self.ml)
-        p.submit(self.idx)
+            try:
+                # 判断该新闻的图片是否由其它语言已经下载过
+                saveStatus = is_exists_img(fileName)
+
+                # 如果未成功下载则重试几次
+                for i in range(CONFIG.get('retry') + 1):
+                    if saveStatus:
+                        break
+                    saveStatus = download(fileName=fileName, url=url)
+
+            # 多次请求失败时 doGET 抛出 FETCHERROR，只放弃当前图片，不结束下载线程
+            except Exception as e:
+                saveStatus, error = False, e
+
+            try:
+                with DB() as db:
+                    # 回填图片地址
+                    if saveStatus:
+                        db.insertDB(sql='update news set img = %s where source_url = %s', args=(imgPath, sourceUrl))
+                        db.bumpVersion()
+                        db.clearRetry(sourceUrl=sourceUrl, kind='img')
+                    # 加入重试队列
+                    else:
+                        LOG(prefix=cls.prefix, msg="文章 [ %s ] 中的图片下载失败，已加入重试队列: %s" % (sourceUrl, error))
+                        db.deadLetter(sourceUrl=sourceUrl, kind='img', source='IMAGES',
+                                      entry={'url': url, 'fileName': fileName, 'imgPath': imgPath},
+                                      error=error or Exception('图片保存失败'))
+            except Exception as e:
+                LOG(prefix=cls.prefix, msg="文章 [ %s ] 中的图片处理异常: %s" % (sourceUrl, e))
+
+            cls.queue.task_done()
+
+
+# 数据库连接池
+class POOL(object):
+    """
+    进程内共享的mysql连接池，连接归还后复用，空闲超过一定时间再次取出时先做健康检查
+    连接开启 autocommit，只读查询不再单独提交，写入需要事务时显式 begin
+    """
+
+    # 日志前缀
+    prefix = '[ POOL ]'
+    # 空闲连接: (连接, 归还时间)，后进先出，优先复用最近用过的连接
+    idle = queue.LifoQueue()
+    # 限制同时借出的连接数，防止突发请求打满 max_connections
+    slots = threading.BoundedSemaphore(CONFIG.get('mysqlPoolSize'))
+    # 创建连接池的进程，子进程不能复用父进程的连接
+    pid = os.getpid()
+    lock = threading.Lock()
+
+    # 新建连接
+    @classmethod
+    def connect(cls):
+        """
+        :return:
+        """
+
+        return pymysql.connect(
+            host=CONFIG.get('mysqlHost'),
+            user=CONFIG.get('mysqlUser'),
+            port=CONFIG.get('mysqlPort'),
+            password=CONFIG.get('mysqlPassword'),
+            database=CONFIG.get('mysqlDB'),
+            autocommit=True,
+        )
+
+    # 借出连接
+    @classmethod
+    def acquire(cls):
+        """
+        :return:
+        """
+
+        # fork 出的子进程重建连接池，丢弃继承自父进程的连接
+        with cls.lock:
+            if cls.pid != os.getpid():
+                cls.idle = queue.LifoQueue()
+                cls.slots = threading.BoundedSemaphore(CONFIG.get('mysqlPoolSize'))
+                cls.pid = os.getpid()
+
+        if not cls.slots.acquire(timeout=CONFIG.get('mysqlPoolTimeout')):
+            raise RuntimeError('数据库连接池已满，等待 [ %d ] 秒后仍无可用连接' % CONFIG.get('mysqlPoolTimeout'))
+
+        try:
+            while True:
+                try:
+                    conn, releaseTime = cls.idle.get_nowait()
+                except queue.Empty:
+                    return cls.connect()
+
+                # 最近用过的连接直接复用
+                if time.time() - releaseTime < CONFIG.get('mysqlPoolCheck'):
+                    return conn
+
+                # 空闲较久的连接先检查，失效则丢弃
+                try:
+                    conn.ping(reconnect=False)
+                    return conn
+                except Exception:
+                    cls.close(conn)
+
+        # 建立连接失败时归还名额
+        except Exception:
+            cls.slots.release()
+            raise
+
+    # 归还连接
+    @classmethod
+    def release(cls, conn):
+        """
+        :param conn:    借出的连接
+        :return:
+        """
+
+        # 连接池已在子进程中重建，不归还旧连接
+        if cls.pid != os.getpid():
+            return
+
+        # 已断开的连接不再复用
+        if conn.open:
+            cls.idle.put((conn, time.time()))
+        else:
+            cls.close(conn)
+        cls.slots.release()
+
+    # 关闭连接
+    @classmethod
+    def close(cls, conn):
+        """
+        :param conn:    连接
+        :return:
+        """
+
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# 数据库操作类
+class DB(object):
+    """
+    数据库操作类
+    """
+
+    # 日志前缀
+    prefix = '[ DB ]'
+    # 新闻表字段，与 saveData 的值列表顺序一致
+    columns = ['title', 'sub_title', 'img', 'content', 'exchange', 'lang', 'source_url', 'created']
+
+    # 连接mysql
+    def __init__(self):
+
+        # 从连接池借出连接
+        self.db = POOL.acquire()
+
+        # 待写入数据缓冲: 表名 -> 值列表
+        self.buffer = {}
+        # 待写入的抓取进度: 来源标识 -> 进度字段，随下一次写入一起提交
+        self.states = {}
+        # 缓冲中新闻的重试数据: 新闻源地址 -> (来源标识, 重试所需的数据)，写入失败时加入重试队列
+        self.retries = {}
+        # 写入失败且未能加入重试队列的来源标识，由调用方取出后不再推进进度
+        self.lost = set()
+        # 上次写入时间
+        self.flushTime = time.time()
+
+    # 上下文管理，退出时（包括异常）写入缓冲并归还连接
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        self.closeDB()
+
+    # 查询数据库
+    def queryDB(self, sql: str, args=None):
+        """
+        :param sql:     查询语句
+        :param args:    参数化查询的参数
+        :return:
+        """
+
+        # 获取游标
+        cursor = self.db.cursor()
+
+        # 执行
+        try:
+
+            # 执行sql 获取结果
+            cursor.execute(sql, args)
+            result = cursor.fetchall()
+
+            # autocommit 连接，只读查询无需提交
+            cursor.close()
+
+            return result
+
+        except Exception as e:
+            LOG(prefix=self.prefix, msg="[ 数据查询异常 ]: %s" % e)
+            cursor.close()
+            return False
+
+    # 通用插入方法
+    def insertDB(self, sql: str, args=None):
+        """
+        :param sql:     插入语句
+        :param args:    参数化语句的参数
+        :return:
+        """
+
+        # 获取游标
+        cursor = self.db.cursor()
+
+        try:
+            cursor.execute(sql, args)
+            self.db.commit()
+        except Exception as e:
+            LOG(prefix=self.prefix, msg="[ 数据写入异常 ]: %s" % e)
+
+        cursor.close()
+
+    # 保存抓取数据
+    def saveData(self, table: str, values: list, source: str = None, entry: dict = None):
+        """
+        先放入缓冲，达到条数或时间间隔后批量写入
+        :param table:   表名称
+        :param values:  值列表，顺序与 columns 一致
+        :param source:  来源标识，写入失败时加入重试队列
+        :param entry:   重试所需的数据
+        :return:
+        """
+
+        self.buffer.setdefault(table, []).append(values)
+        if source is not None:
+            self.retries[values[self.columns.index('source_url')]] = (source, entry)
+
+        # 判断是否需要写入
+        if sum(len(rows) for rows in self.buffer.values()) >= CONFIG.get('flushSize') or \
+                time.time() - self.flushTime >= CONFIG.get('flushInterval'):
+            self.flush()
+
+    # 批量写入缓冲数据
+    def flush(self):
+        """
+        每张表一个事务，参数化 executemany 写入
+        :return:        成功写入的条数
+        """
+
+        saved = 0
+        # 抓取进度与新闻在同一事务中写入
+        states, self.states = self.states, {}
+        retries, self.retries = self.retries, {}
+        for table, rows in self.buffer.items():
+
+            # 生成参数化sql
+            sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join(self.columns),
+                                                       ', '.join(['%s'] * len(self.columns)))
+
+            # 获取游标
+            cursor = self.db.cursor()
+
+            try:
+                # executemany 可能拆成多条语句，显式开启事务保证整批写入或整批回滚
+                self.db.begin()
+                cursor.executemany(sql, rows)
+                self.countRows(cursor, rows)
+                self.indexRows(cursor, table, rows)
+                self.saveStates(cursor, states)
+                self.db.commit()
+                written = rows
+                states = {}
+
+            # 整批失败则回滚，逐条重试找出异常数据
+            except Exception as e:
+                self.db.rollback()
+                LOG(prefix=self.prefix, msg="[ 批量写入异常，改为逐条写入 ]: %s" % e)
+
+                # 逐条写入同样在一个事务中，计数、全文检索和抓取进度与写入成功的新闻一起提交
+                # 写入失败的新闻在同一事务中加入重试队列；未能加入的，本次不推进任何抓取进度
+                self.db.begin()
+                written = []
+                lost = set()
+                for row in rows:
+                    sourceUrl = row[self.columns.index('source_url')]
+                    try:
+                        cursor.execute(sql, row)
+                        written.append(row)
+                    except Exception as e:
+                        LOG(prefix=self.prefix, msg="[ 数据写入异常 ] [ %s ]: %s" % (sourceUrl, e))
+                        source, entry = retries.get(sourceUrl, (None, None))
+                        if source is None or not self.saveRetry(cursor, sourceUrl=sourceUrl, kind='news',
+                                                                source=source, entry=entry, error=e):
+                            lost.add(source)
+                self.countRows(cursor, written)
+                self.indexRows(cursor, table, written)
+                if not lost:
+                    self.saveStates(cursor, states)
+                self.db.commit()
+                self.lost |= lost
+                states = {}
+
+            cursor.close()
+
+            # 登记已写入的新闻地址
+            for row in written:
+                DEDUP.add(row[self.columns.index('source_url')])
+            saved += len(written)
+
+        # 没有新闻写入时单独保存进度
+        if states:
+            cursor = self.db.cursor()
+            self.saveStates(cursor, states)
+            cursor.close()
+
+        # 清空缓冲
+        self.buffer = {}
+        self.flushTime = time.time()
+
+        # 数据有变化，通知API失效缓存
+        if saved:
+            self.bumpVersion()
+
+        return saved
+
+    # 读取抓取进度
+    def crawlState(self, source: str):
+        """
+        :param source:  来源标识
+        :return:        last_nid、last_created、walk_cursor、last_pass，没有记录时为空字典
+        """
+
+        result = self.queryDB(sql='select last_nid, last_created, walk_cursor, last_pass from crawlState '
+                                  'where source = %s', args=(source,))
+        if not result:
+            return {}
+        return dict(zip(['last_nid', 'last_created', 'walk_cursor', 'last_pass'], result[0]))
+
+    # 读取某个站点的回填分段
+    def partitions(self, source: str):
+        """
+        :param source:  站点的来源标识
+        :return:        [(分段标识, walk_cursor, last_pass)]
+        """
+        return self.queryDB(sql='select source, walk_cursor, last_pass from crawlState where source like %s',
+                            args=(source + '/%',)) or []
+
+    # 暂存抓取进度，随下一次写入一起提交
+    def advance(self, source: str, **fields):
+        """
+        :param source:  来源标识
+        :param fields:  需要更新的进度字段
+        :return:
+        """
+        self.states.setdefault(source, {}).update(fields)
+
+    # 写入多个来源的抓取进度
+    def saveStates(self, cursor, states: dict):
+        """
+        :param cursor:  写入新闻所用的游标
+        :param states:  来源标识 -> 进度字段
+        :return:
+        """
+        for source, fields in states.items():
+            self.saveState(cursor, source, fields)
+
+    # 写入抓取进度，与新闻写入在同一事务中执行
+    def saveState(self, cursor, source: str, fields: dict):
+        """
+        :param cursor:  写入新闻所用的游标
+        :param source:  来源标识
+        :param fields:  需要更新的字段，last_nid、last_created、walk_cursor、last_pass
+        :return:
+        """
+
+        columns = list(fields)
+        cursor.execute('insert into crawlState (source, %s) values (%%s, %s) on duplicate key update %s'
+                       % (', '.join(columns), ', '.join(['%s'] * len(columns)),
+                          ', '.join('%s = values(%s)' % (column, column) for column in columns)),
+                       [source] + [fields[column] for column in columns])
+
+    # 累加新闻计数，与新闻写入在同一事务中执行
+    def incrCounter(self, cursor, exchange: str, lang: str, count: int = 1):
+        """
+        :param cursor:      写入新闻所用的游标
+        :param exchange:    交易所/站点标识
+        :param lang:        语言
+        :param count:       新增条数
+        :return:
+        """
+        cursor.execute('insert into newsCounter (exchange, lang, total) values (%s, %s, %s) '
+                       'on duplicate key update total = total + values(total)', (exchange or '', lang or '', count))
+
+    # 按 交易所/站点 + 语言 累加一批新闻的计数
+    def countRows(self, cursor, rows: list):
+        """
+        :param cursor:  写入新闻所用的游标
+        :param rows:    已写入的值列表，顺序与 columns 一致
+        :return:
+        """
+
+        counts = {}
+        for row in rows:
+            key = (row[self.columns.index('exchange')], row[self.columns.index('lang')])
+            counts[key] = counts.get(key, 0) + 1
+        for (exchange, lang), count in counts.items():
+            self.incrCounter(cursor, exchange=exchange, lang=lang, count=count)
+
+    # 写入全文检索数据，按 source_url 关联刚写入的新闻
+    def indexRows(self, cursor, table: str, rows: list):
+        """
+        :param cursor:  写入新闻所用的游标
+        :param table:   新闻表名称
+        :param rows:    已写入的值列表，顺序与 columns 一致
+        :return:
+        """
+
+        if not rows:
+            return
+
+        sql = 'insert ignore into newsText (id, title, sub_title, content) ' \
+              'select id, %%s, %%s, %%s from %s where source_url = %%s' % table
+        cursor.executemany(sql, [(row[self.columns.index('title')], row[self.columns.index('sub_title')],
+                                  plainText(row[self.columns.index('content')]),
+                                  row[self.columns.index('source_url')]) for row in rows])
+
+    # 递增数据版本号
+    def bumpVersion(self):
+        """
+        :return:
+        """
+        self.insertDB(sql='update newsVersion set version = version + 1 where id = 1')
+
+    # 批量查询已存储的新闻地址
+    def existsUrls(self, urls: list):
+        """
+        :param urls:    新闻源地址列表
+        :return:        数据库中已存在的地址集合
+        """
+
+        if not urls:
+            return set()
+
+        # 一次 IN 查询代替逐条查询
+        sql = 'select source_url from news where source_url in (%s)' % ','.join(['%s'] * len(urls))
+        result = self.queryDB(sql=sql, args=list(urls))
+
+        # 查询失败时按全部未存储处理
+        if result is False:
+            return set()
+        return set(item[0] for item in result)
+
+    # 记录失败的新闻/图片，按指数退避安排下次重试，超过最大次数后不再重试
+    def deadLetter(self, sourceUrl: str, kind: str, source: str, entry: dict, error: Exception):
+        """
+        :param sourceUrl:   新闻源地址
+        :param kind:        news 新闻详情，img 图片
+        :param source:      来源标识，重试时据此找到站点
+        :param entry:       重试所需的数据
+        :param error:       失败原因
+        :return:            是否记录成功
+        """
+
+        cursor = self.db.cursor()
+        recorded = self.saveRetry(cursor, sourceUrl=sourceUrl, kind=kind, source=source, entry=entry, error=error)
+        if recorded:
+            self.db.commit()
+        cursor.close()
+
+        return recorded
+
+    # 写入重试记录，由调用方提交，可与新闻写入在同一事务中执行
+    def saveRetry(self, cursor, sourceUrl: str, kind: str, source: str, entry: dict, error: Exception):
+        """
+        :param cursor:      写入所用的游标
+        :param sourceUrl:   新闻源地址
+        :param kind:        news 新闻详情，img 图片
+        :param source:      来源标识
+        :param entry:       重试所需的数据
+        :param error:       失败原因
+        :return:            是否写入成功
+        """
+
+        now = time.time()
+        errorClass = type(error).__name__
+        if getattr(error, 'reason', None):
+            errorClass += ':' + error.reason
+
+        # 已有记录时次数加一，退避时间为 retryBase * 2^(次数-1)，最长 retryMax
+        sql = 'insert into newsRetry (source_url, kind, source, entry, error_class, error, attempts, next_attempt, ' \
+              'created) values (%s, %s, %s, %s, %s, %s, 1, %s, %s) on duplicate key update ' \
+              'error_class = values(error_class), error = values(error), attempts = attempts + 1, ' \
+              'next_attempt = if(attempts >= %s, null, %s + least(%s * pow(2, attempts - 1), %s))'
+        args = (sourceUrl, kind, source, json.dumps(entry, ensure_ascii=False), errorClass[:64], str(error),
+                now + CONFIG.get('retryBase'), now,
+                CONFIG.get('retryAttempts'), now, CONFIG.get('retryBase'), CONFIG.get('retryMax'))
+
+        try:
+            cursor.execute(sql, args)
+            return True
+        except Exception as e:
+            LOG(prefix=self.prefix, msg="[ 重试记录写入异常 ] [ %s ]: %s" % (sourceUrl, e))
+            return False
+
+    # 取出到期需要重试的记录，同时把下次重试时间推后 retryBase，处理中（如排队下载的图片）的记录不会被重复取出
+    def dueRetries(self, sources: list, limit: int):
+        """
+        :param sources: 本程序负责的来源标识，另一个程序的记录不取出
+        :param limit:   最多取多少条
+        :return:        [(source_url, kind, source, entry)]
+        """
+
+        now = time.time()
+        sql = 'select source_url, kind, source, entry from newsRetry where source in (%s) and next_attempt <= %%s ' \
+              'order by next_attempt limit %%s for update' % ', '.join(['%s'] * len(sources))
+
+        cursor = self.db.cursor()
+        try:
+            self.db.begin()
+            cursor.execute(sql, list(sources) + [now, limit])
+            result = cursor.fetchall()
+            for sourceUrl, kind, source, entry in result:
+                cursor.execute('update newsRetry set next_attempt = %s where source_url = %s and kind = %s',
+                               (now + CONFIG.get('retryBase'), sourceUrl, kind))
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            LOG(prefix=self.prefix, msg="[ 重试记录读取异常 ]: %s" % e)
+            result = ()
+        cursor.close()
+
+        return [(sourceUrl, kind, source, json.loads(entry)) for sourceUrl, kind, source, entry in result]
+
+    # 重试成功，删除记录
+    def clearRetry(self, sourceUrl: str, kind: str):
+        """
+        :param sourceUrl:   新闻源地址
+        :param kind:        news 新闻详情，img 图片
+        :return:
+        """
+        self.insertDB(sql='delete from newsRetry where source_url = %s and kind = %s', args=(sourceUrl, kind))
+
+    # 执行数据库迁移
+    def migrate(self):
+        """
+        每条迁移语句只执行一次，已执行的记录在 newsMigration 中（按语句哈希，两个程序共用）
+        :return:
+        """
+
+        cursor = self.db.cursor()
+        cursor.execute('create table if not exists newsMigration (name char(40) primary key, statement text, '
+                       'applied timestamp not null default current_timestamp)')
+        cursor.execute('select name from newsMigration')
+        applied = set(item[0] for item in cursor.fetchall())
+
+        for sql in MIGRATIONS:
+            name = hashlib.sha1(sql.encode('utf-8')).hexdigest()
+            if name in applied:
+                continue
+            try:
+                cursor.execute(sql)
+                LOG(prefix=self.prefix, msg="[ 数据库迁移 ]: %s" % sql)
+            except pymysql.err.OperationalError as e:
+                # 1050 表已存在，1060 字段已存在，1061 索引已存在
+                if e.args[0] not in (1050, 1060, 1061):
+                    raise
+            cursor.execute('insert ignore into newsMigration (name, statement) values (%s, %s)', (name, sql))
+        self.db.commit()
+        cursor.close()
+
+    # 关闭连接
+    def closeDB(self):
+        """
+        :return:
+        """
+
+        # 已经归还
+        if self.db is None:
+            return
+
+        # 写入剩余缓冲数据，写入失败也要归还连接
+        try:
+            self.flush()
+        finally:
+            POOL.release(self.db)
+            self.db = None
+
+
+# 新闻去重
+class DEDUP(object):
+    """
+    已存储新闻地址的进程内缓存，未命中的地址按列表页批量回查数据库
+    """
+
+    # 日志前缀
+    prefix = '[ DEDUP ]'
+    # 已知的 source_url
+    known = set()
+    # 是否已经预热，多个站点并发抓取时只预热一次
+    warmed = False
+    lock = threading.Lock()
+
+    # 启动预热
+    @classmethod
+    def warm(cls):
+        """
+        :return:
+        """
+
+        with cls.lock:
+            cls.load()
+
+    # 加载最近的新闻地址
+    @classmethod
+    def load(cls):
+        """
+        :return:
+        """
+
+        if cls.warmed:
+            return
+
+        # 预热最近的N条，0为全部
+        sql = 'select source_url from news'
+        if CONFIG.get('dedupWarm'):
+            sql += ' order by id desc limit %d' % CONFIG.get('dedupWarm')
+        with DB() as db:
+            result = db.queryDB(sql=sql)
+
+        # 查询失败则下次再试
+        if result is False:
+            return
+
+        cls.known.update(item[0] for item in result)
+        cls.warmed = True
+        LOG(prefix=cls.prefix, msg="已预热 [ %d ] 条新闻地址" % len(cls.known))
+
+    # 过滤出未存储的地址
+    @classmethod
+    def unknown(cls, db: DB, urls: list):
+        """
+        :param db:      数据库对象
+        :param urls:    本页新闻源地址列表
+        :return:        未存储的地址集合
+        """
+
+        cls.warm()
+
+        # 缓存未命中的地址批量回查
+        missing = [url for url in set(urls) if url not in cls.known]
+        exists = db.existsUrls(missing)
+        cls.known.update(exists)
+
+        return set(missing) - exists
+
+    # 写入成功后登记
+    @classmethod
+    def add(cls, url: str):
+        """
+        :param url:     新闻源地址
+        :return:
+        """
+        cls.known.add(url)
+
+
+# 站点适配基类
+class SITE(object):
+    """
+    站点适配基类
+    子类只声明列表地址、选择器、清理规则和字段映射，类定义时编译为提取计划，由 PIPELINE 统一驱动抓取
+    选择器说明：
+        简单选择器 tag.class / tag#id 用于只解析需要的节点，属性值按前缀匹配（兼容 CSS Modules 的哈希后缀）
+        其余选择器为CSS选择器，在已解析的节点内查找
+    """
+
+    # 已注册的站点适配器
+    registry = []
+
+    # 日志前缀
+    prefix = '[ SITE ]'
+    # 站点标识，写入 exchange 字段
+    exchange = ''
+    # 固定语言，为空时取列表中的语言字段
+    lang = ''
+    # 请求头
+    headers = {}
+    # 定时任务，crontab 格式，为空时使用 CONFIG 中的 cron；interval 为间隔秒数，设置后优先使用
+    cron = None
+    interval = None
+
+    # 列表地址模板，可用 {page}（页码，从 firstPage 开始）和 {offset}（第几条开始）
+    indexTemplate = ''
+    # 每页条数，起始页码
+    pageSize = 10
+    firstPage = 0
+    # 列表格式: json 或 html
+    indexType = 'json'
+    # json: 新闻列表所在的键；html: 新闻条目的CSS选择器列表，取条目中第一个链接
+    indexItems = 'results'
+    # html: 只解析列表所在节点，简单选择器列表
+    indexBody = []
+    # json: 列表字段映射，新闻字段 -> json键
+    indexFields = {}
+    # json: 新闻源地址模板，html 列表直接使用条目链接
+    sourceUrl = ''
+    # html: 从新闻源地址提取新闻id的正则
+    idPattern = ''
+    # 列表发布时间单位换算，毫秒为1000
+    createdScale = 1
+    # 列表字段必须匹配的正则，如只抓中文新闻
+    require = {}
+    # 需要跳过的新闻源地址正则
+    skip = ''
+
+    # 详情页主体，简单选择器，只解析该节点
+    body = ''
+    # 正文在主体中的CSS选择器，为空时为主体本身
+    content = ''
+    # 正文清理规则，按顺序执行，每条为CSS选择器（删除第一个匹配节点）或字典:
+    #   select: CSS选择器    all: 删除全部匹配节点    last: 删除最后一个匹配节点
+    #   up: 向上删除第几层父节点    contains: 节点文本包含该字符串时才删除    then: 删除后继续执行的规则
+    clean = []
+    # 正文只取第一个子节点（剔除外围多余标签）
+    firstChild = False
+    # 详情页文本字段: 新闻字段 -> CSS选择器
+    detailFields = {}
+    # 详情页发布时间: (CSS选择器, 正则, 时间格式列表)，在全部匹配节点的文本中查找，见 parseCreated
+    detailCreated = None
+    # 是否从详情页 og:image 提取图片
+    detailImg = False
+    # 图片文件名模板
+    imgName = '{id}'
+
+    # 子类定义时编译提取计划并注册
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls.plan = {
+            'indexBody': cls.simpleSelector(cls.indexBody),
+            'indexItems': [soupsieve.compile(item) for item in cls.indexItems] if cls.indexType == 'html' else [],
+            'require': {field: re.compile(pattern) for field, pattern in cls.require.items()},
+            'skip': re.compile(cls.skip) if cls.skip else None,
+            'idPattern': re.compile(cls.idPattern) if cls.idPattern else None,
+            'body': cls.simpleSelector([cls.body] if cls.body else []),
+            'content': soupsieve.compile(cls.content) if cls.content else None,
+            'clean': cls.compileRules(cls.clean),
+            'detailFields': {field: soupsieve.compile(select) for field, select in cls.detailFields.items()},
+            'detailCreated': (soupsieve.compile(cls.detailCreated[0]), re.compile(cls.detailCreated[1], re.I),
+                              cls.detailCreated[2]) if cls.detailCreated else None,
+        }
+
+        # 抓取进度标识
+        cls.source = cls.__name__
+
+        if cls.exchange:
+            SITE.registry.append(cls)
+
+    # 编译简单选择器
+    @staticmethod
+    def simpleSelector(selectors: list):
+        """
+        :param selectors:   简单选择器列表，tag.class 或 tag#id，同一列表须使用同一种属性
+        :return:            (SoupStrainer, 标签名列表, 属性条件)，列表为空时为None
+        """
+
+        if not selectors:
+            return None
+
+        names, attr, values = [], None, []
+        for selector in selectors:
+            name, mark, value = re.match(r'^(\w+)([.#])(.+)$', selector).groups()
+            names.append(name)
+            attr = 'class' if mark == '.' else 'id'
+            values.append(re.escape(value))
+
+        attrs = {attr: re.compile(r'(^|\s)(%s)' % '|'.join(values))}
+        return SoupStrainer(names, attrs=attrs), names, attrs
+
+    # 编译清理规则
+    @classmethod
+    def compileRules(cls, rules: list):
+        """
+        :param rules:   清理规则列表
+        :return:
+        """
+
+        compiled = []
+        for rule in rules:
+            if isinstance(rule, str):
+                rule = {'select': rule}
+            compiled.append({
+                'select': soupsieve.compile(rule['select']),
+                'all': rule.get('all', False),
+                'last': rule.get('last', False),
+                'up': rule.get('up', 0),
+                'contains': rule.get('contains'),
+                'then': cls.compileRules(rule.get('then', [])),
+            })
+        return compiled
+
+    # 执行清理规则
+    @classmethod
+    def applyRules(cls, node, rules: list):
+        """
+        :param node:    正文节点
+        :param rules:   已编译的清理规则
+        :return:
+        """
+
+        for rule in rules:
+
+            # 找到需要删除的节点
+            if rule['all'] or rule['last']:
+                matches = rule['select'].select(node)
+                if rule['last']:
+                    matches = matches[-1:]
+            else:
+                match = rule['select'].select_one(node)
+                matches = [match] if match is not None else []
+
+            for match in matches:
+                # 按文本条件判断
+                if rule['contains'] is not None and rule['contains'] not in match.text:
+                    continue
+                # 向上删除父节点
+                for i in range(rule['up']):
+                    match = match.parent
+                match.decompose()
+                cls.applyRules(node, rule['then'])
+
+    # 列表页地址
+    def indexUrl(self, page: int):
+        """
+        :param page:    第几页，从0开始
+        :return:
+        """
+        return self.indexTemplate.format(page=page + self.firstPage, offset=page * self.pageSize)
+
+    # 获取新闻列表
+    def getNeswIndex(self, page: int, cached: bool = True):
+        """
+        :param page:    第几页，从0开始
+        :param cached:  是否使用列表缓存，False 时总是重新处理
+        :return:        列表中的全部新闻条目（未经 accept 过滤），与上次处理完成时相比未变化则返回None
+        """
+
+        if not cached:
+            return self.parseIndex(source=doGET(url=self.indexUrl(page=page), headers=self.headers), page=page)
+
+        source = HTTPCACHE.get(url=self.indexUrl(page=page), headers=self.headers)
+        if source is None:
+            return None
+        return self.parseIndex(source=source, page=page)
+
+    # 解析新闻列表
+    def parseIndex(self, source: str, page: int):
+        """
+        :param source:  列表页源码
+        :param page:    第几页，从0开始
+        :return:        列表中的全部新闻条目，每条至少包含 id、source_url
+                        是否抓取由调用方按 accept 过滤，未过滤的条数用于判断是否已到最后一页/是否衔接上
+        """
+
+        entries = []
+
+        # json 列表按字段映射
+        if self.indexType == 'json':
+            for item in json.loads(source)[self.indexItems]:
+                entry = {field: item.get(key) for field, key in self.indexFields.items()}
+                entry['source_url'] = self.sourceUrl.format(**entry)
+                if entry.get('created') is not None:
+                    entry['created'] = entry['created'] / self.createdScale
+                entries.append(entry)
+
+        # html 列表取条目中的第一个链接
+        else:
+            plan = self.plan['indexBody']
+            soup = parseHTML(source, parseOnly=plan[0] if plan else None)
+            for items in self.plan['indexItems']:
+                for item in items.select(soup):
+                    link = item.find("a")
+                    if link is None or not link.attrs.get('href'):
+                        continue
+                    sourceUrl = urljoin(self.indexUrl(page=page), link.attrs.get('href'))
+                    newsId = self.plan['idPattern'].search(sourceUrl)
+                    entries.append({
+                        'id': newsId.group(1) if newsId is not None else '',
+                        'source_url': sourceUrl,
+                    })
+
+        return entries
+
+    # 判断是否需要抓取该新闻
+    def accept(self, entry: dict):
+        """
+        :param entry:   新闻条目
+        :return:
+        """
+
+        if self.plan['skip'] is not None and self.plan['skip'].search(entry['source_url']):
+            return False
+        for field, pattern in self.plan['require'].items():
+            if not pattern.search(entry.get(field) or ''):
+                return False
+        return True
+
+    # 获取新闻详情
+    def getNewsDetails(self, entry: dict):
+        """
+        :param entry:   新闻条目
+        :return:        入库数据，字段见 DB.columns，另含图片文件名 imgName
+        """
+
+        source = doGET(url=entry['source_url'], headers=self.headers)
+        return self.parseDetails(source=source, entry=entry)
+
+    # 解析新闻详情
+    def parseDetails(self, source: str, entry: dict):
+        """
+        :param source:  详情页源码
+        :param entry:   新闻条目
+        :return:
+        """
+
+        # 只解析主体
+        strainer, names, attrs = self.plan['body']
+        body = parseHTML(source, parseOnly=strainer).find(names, attrs=attrs)
+
+        # 提取正文并清理
+        context = self.plan['content'].select_one(body) if self.plan['content'] is not None else body
+        self.applyRules(context, self.plan['clean'])
+        if self.firstChild:
+            context = context.contents[0]
+
+        # 组装数据，详情页字段优先
+        new = {
+            'title': entry.get('title'),
+            'sub_title': entry.get('sub_title'),
+            'img': entry.get('img') or '',
+            'content': str(context),
+            'exchange': self.exchange,
+            'lang': self.lang or entry.get('lang'),
+            'source_url': entry['source_url'],
+            'created': entry.get('created'),
+            'imgName': self.imgName.format(**entry),
+        }
+        for field, select in self.plan['detailFields'].items():
+            new[field] = select.select_one(body).text
+        if self.plan['detailCreated'] is not None:
+            select, pattern, dateFormats = self.plan['detailCreated']
+            new['created'] = parseCreated(' '.join(node.text for node in select.select(body)), pattern, dateFormats)
+        if self.detailImg:
+            new['img'] = ogImage(source)
+
+        return new
+
+    # 单独抓取该站点
+    def spider(self):
+        """
+        :return:
+        """
+        PIPELINE(self).run()
+
+
+# 马来西亚中文站
+class ML(SITE):
+    """
+    马来西亚抓取类
+    """
+    prefix = '[ ML ]'
+    exchange = 'ml'
+    headers = {
+        'Referer': 'https://theedgemalaysia.com/',
+        'User-Agent': userAgent
+    }
 
-        # 阻塞主进程
-        p.shutdown()
+    # 列表
+    indexTemplate = 'https://theedgemalaysia.com/api/loadMoreCategories?offset={offset}&categories=news'
+    indexFields = {'id': 'nid', 'title': 'title', 'sub_title': 'summary', 'img': 'img',
+                   'lang': 'language', 'created': 'created'}
+    sourceUrl = 'https://theedgemalaysia.com/node/{id}'
+    createdScale = 1000
+    # 只抓中文新闻
+    require = {'title': r'[\u0e00-\u9fa5]'}
+
+    # 详情
+    body = 'div.news-detail_newsTextDataWrap'
+    clean = [
+        # 删除广告
+        'div.inPageAd',
+        # 删除底部英文链接
+        {'select': 'em', 'contains': 'version',
+         'then': ['a', {'select': 'div.newsTextDataWrapInner', 'last': True}]},
+    ]
+    firstChild = True
+
+
+# 马来西亚英文站
+class MLEN(ML):
+    """
+    马来西亚英文站新闻采集类
+    """
+    prefix = '[ ML-EN ]'
+    headers = {
+        'Referer': 'https://theedgemalaysia.com/',
+        'User-Agent': userAgent,
+        'Accept-Language': 'en',
+    }
+
+    indexTemplate = 'https://theedgemalaysia.com/api/loadMoreCategories?offset={offset}&categories=malaysia'
+    require = {}
+
+
+# 印度印地语站
+class IDXHI(SITE):
+    """
+    印度抓取类，其它语言在此基础上修改
+    """
+    prefix = '[ IDX-HI ]'
+    exchange = 'id'
+    lang = 'hindi'
+    headers = {
+        'Referer': 'https://hindi.moneycontrol.com',
+        'User-Agent': userAgent
+    }
+
+    # 列表
+    indexTemplate = 'https://hindi.moneycontrol.com/news/latest-news/page-{page}'
+    firstPage = 1
+    indexType = 'html'
+    indexBody = ['h2.topNews_h2', 'div.Category_cat-inn']
+    indexItems = ['h2.topNews_h2', 'div[class*="Category_cat-inn"]']
+    idPattern = r'([^.-]*)[.-][^.-]*$'
+    # 新闻直播和每日汇总，收费新闻，拍卖等
+    skip = r'news-live|moneycontrol-daily|news/videos|news/cricket'
+
+    # 详情
+    body = 'div.lft-side'
+    content = 'div[class*="Article_body"]'
+    clean = [
+        # 剔除广告
+        'aside',
+        {'select': 'a', 'up': 2},
+        # 剔除JS
+        'script',
+    ]
+    firstChild = True
+    detailFields = {'title': 'h1', 'sub_title': 'h2'}
+    # 作者栏最后一段为 "Updated Oct 10, 2025 10:00 AM"（React 渲染，文字之间有注释分隔），部分新闻只有日期
+    detailCreated = ('div[class*="Tag_author_rgt"] p', createdPattern, createdFormats)
+    detailImg = True
+    imgName = 'idx_{id}'
+
+
+# 印度古吉拉特语站
+class IDXGU(IDXHI):
+    """
+    印度古吉拉特语站
+    """
+    prefix = '[ IDX-GU ]'
+    lang = 'gujarati'
+    headers = {
+        'Referer': 'https://gujarati.moneycontrol.com',
+        'User-Agent': userAgent
+    }
+
+    indexTemplate = 'https://gujarati.moneycontrol.com/news/latest-news/page-{page}'
+
+
+# 印度英文站
+class IDXEN(IDXHI):
+    """
+    印度英文站
+    """
+    prefix = '[ IDX-EN ]'
+    lang = 'en'
+    headers = {
+        'Referer': 'https://www.moneycontrol.com',
+        'User-Agent': userAgent
+    }
+
+    # 列表
+    indexTemplate = 'https://www.moneycontrol.com/news/news-all/page-{page}'
+    indexBody = ['ul#cagetory']
+    indexItems = ['ul#cagetory h2']
+
+    # 详情
+    body = 'div.page_left_wrapper'
+    content = '#contentdata'
+    clean = [
+        # 剔除广告
+        {'select': 'div', 'all': True},
+        # 剔除JS
+        'script',
+    ]
+    firstChild = False
+    # "first published: Oct 10, 2025 09:00 am"
+    detailCreated = ('div.tags_last_line', createdPattern, createdFormats)
+
+
+# 抓取流水线
+class PIPELINE(object):
+    """
+    所有站点共用的抓取流程：列表 -> 去重 -> 并发抓取详情 -> 批量入库 -> 后台下载图片 -> 判断翻页
+    同一条流水线中的多个站点逐页同步推进，每页的详情请求合并并发
+    """
+
+    # 日志前缀
+    prefix = '[ PIPELINE ]'
+    # 站点 -> 已处理过的被过滤新闻地址，按站点分开（ML 过滤掉的英文新闻仍由 MLEN 抓取），不计入已存储新闻的缓存
+    filtered = collections.defaultdict(set)
+    lock = threading.Lock()
+
+    def __init__(self, *sites: SITE):
+
+        # 需要抓取的站点
+        self.sites = list(sites)
+
+    # 执行一次抓取
+    def run(self):
+        """
+        :return:
+        """
+
+        # 异常退出时同样归还连接，未写入的抓取进度随之提交
+        with DB() as db:
+            self.crawl(db=db)
+
+        LOG(prefix=self.prefix, msg='各域名当前速率: %s' % RATELIMIT.rates())
+
+    # 逐页抓取各站点
+    def crawl(self, db):
+        """
+        :param db:      mysql对象
+        :return:
+        """
+
+        # 各站点的抓取进度：中断位置、上次衔接上的最新发布时间、本次见到的最新新闻
+        walks = {}
+        for site in self.sites:
+            state = db.crawlState(source=site.source)
+            walks[site] = {
+                'resume': int(state['walk_cursor']) if state.get('walk_cursor') else None,
+                'watermark': state.get('last_created'),
+                'newest': (state['last_created'], state['last_nid'] or '') if state.get('last_created') else None,
+                'failed': False,
+            }
+            if walks[site]['resume'] is not None:
+                LOG(prefix=site.prefix, msg='上次抓取在第 [ %d ] 页中断，重新处理之前的页' % (walks[site]['resume'] + 1))
+
+        # 需要继续翻页的站点
+        active = list(self.sites)
+
+        # 循环页数，由 nextPage 决定每个站点何时停止
+        for page in itertools.count():
+
+            # 所有站点都已衔接上
+            if not active:
+                break
+
+            # 并发获取各站点的新闻列表，中断前的页不使用列表缓存
+            indexes = FETCHER().gather([
+                (site.indexUrl(page=page), site.getNeswIndex,
+                 {'page': page, 'cached': walks[site]['resume'] is None or page > walks[site]['resume']})
+                for site in active
+            ])
+
+            # 汇总列表中的新闻
+            listed = []
+            # 被 skip/require 过滤的新闻，不抓取但参与判断是否衔接上
+            rejected = []
+            # 列表有变化的站点
+            fetched = []
+            for site, entries in zip(active, indexes):
+
+                # 列表获取失败则跳过该站点
+                if isinstance(entries, Exception):
+                    LOG(prefix=site.prefix, msg='第 [ %d ] 页列表获取失败: %s' % (page + 1, entries))
+                    continue
+
+                # 列表未变化则跳过该站点
+                if entries is None:
+                    LOG(prefix=site.prefix, msg='第 [ %d ] 页无变化，已跳过' % (page + 1))
+                    continue
+
+                fetched.append(site)
+                for entry in entries:
+                    (listed if site.accept(entry) else rejected).append((site, entry))
+
+            # 批量判断数据库中是否已经存储，已存储或同页重复的不再请求详情页
+            unknown = DEDUP.unknown(db=db, urls=[entry['source_url'] for site, entry in listed])
+            # 各站点本页未处理过的新闻条数（包含被过滤的），整页都被过滤时不会误判为已衔接上
+            with self.lock:
+                fresh = collections.Counter(site for site, entry in listed if entry['source_url'] in unknown)
+                fresh.update(site for site, entry in rejected if entry['source_url'] not in self.filtered[site.source])
+            pending = []
+            for site, entry in listed:
+                if entry['source_url'] in unknown:
+                    unknown.discard(entry['source_url'])
+                    pending.append((site, entry))
+
+            # 并发获取新闻详情
+            details = FETCHER(deadline=CONFIG.get('articleDeadline'), hedge=CONFIG.get('hedge')).gather([
+                (entry['source_url'], site.getNewsDetails, {'entry': entry}) for site, entry in pending
+            ])
+
+            # 待下载的图片
+            images = []
+            # 有抓取失败新闻的站点
+            failed = set()
+
+            # 循环新闻详情
+            for (site, entry), new in zip(pending, details):
+
+                # 详情抓取或解析失败则加入重试队列，记录失败时下次重新处理本页
+                if isinstance(new, Exception):
+                    LOG(prefix=site.prefix, msg="文章 [ %s ] 详情抓取失败，已加入重试队列: %s"
+                                                % (entry['source_url'], new))
+                    if not db.deadLetter(sourceUrl=entry['source_url'], kind='news', source=site.source,
+                                         entry=entry, error=new):
+                        failed.add(site)
+                        walks[site]['failed'] = True
+                    continue
+
+                self.store(db=db, new=new, images=images, source=site.source, entry=entry)
+                self.seen(walk=walks[site], created=new['created'], nid=entry['id'])
+
+            # 记录本页已处理，与本页新闻在同一事务中写入
+            for site, entry in listed + rejected:
+                self.seen(walk=walks[site], created=entry.get('created'), nid=entry['id'])
+            for site in fetched:
+                db.advance(site.source, walk_cursor=str(page))
+
+            # 按页写入数据库，之后再提交图片下载
+            db.flush()
+            for image in images:
+                IMAGES.submit(*image)
+
+            # 有新闻写入失败且未能加入重试队列的站点，按抓取失败处理
+            lost, db.lost = db.lost, set()
+            for site in fetched:
+                if site.source in lost or None in lost:
+                    failed.add(site)
+                    walks[site]['failed'] = True
+
+            # 被过滤的新闻不会入库，登记为本站点已处理，下次见到时不再计入未处理的条数
+            with self.lock:
+                for site, entry in rejected:
+                    self.filtered[site.source].add(entry['source_url'])
+
+            # 整页处理成功才记录列表缓存，否则下次重新处理
+            for site in fetched:
+                if site not in failed:
+                    HTTPCACHE.commit(site.indexUrl(page=page))
+
+            # 判断各站点是否继续翻页
+            following = []
+            for site, entries in zip(active, indexes):
+
+                # 日志提示
+                if site in fetched:
+                    LOG(prefix=site.prefix, msg="第 [ %d ] 页抓取完成" % (page + 1))
+
+                walk = walks[site]
+
+                # 列表获取失败时保留中断位置，下次从头重新处理
+                if isinstance(entries, Exception):
+                    if nextPage(page=page, fresh=0, resume=walk['resume']):
+                        following.append(site)
+                    continue
+
+                # 列表未变化或为空
+                if site not in fetched or not entries:
+                    if nextPage(page=page, fresh=0, resume=walk['resume']):
+                        following.append(site)
+                    else:
+                        self.finish(db=db, site=site, walk=walk)
+                    continue
+
+                # 列表带发布时间的站点，对比上次衔接上的最新新闻
+                created = [entry['created'] for entry in entries if entry.get('created') is not None]
+                newest = max(created) if created else None
+
+                if nextPage(page=page, fresh=fresh[site],
+                            newest=newest, watermark=walk['watermark'], resume=walk['resume']):
+                    following.append(site)
+                else:
+                    self.finish(db=db, site=site, walk=walk)
+
+            active = following
+
+    # 写入一条新闻
+    @staticmethod
+    def store(db, new: dict, images: list, source: str, entry: dict):
+        """
+        :param db:      mysql对象
+        :param new:     新闻详情
+        :param images:  待下载的图片，需要下载时追加到末尾
+        :param source:  来源标识，写入失败时据此加入重试队列
+        :param entry:   列表中的新闻，重试所需的数据
+        :return:
+        """
+
+        # 图片：由其它语言已经下载过的直接使用，否则先留空，入库后交给后台下载
+        imgName = '%s/%s.jpg' % (CONFIG.get('imgDir'), new['imgName'])
+        imgPath = '%s/%s.jpg' % (CONFIG.get('imgUrl'), new['imgName'])
+        imgUrl = new['img']
+        new['img'] = ''
+        if imgUrl != '' and is_exists_img(imgName):
+            new['img'] = imgPath
+        elif imgUrl != '':
+            images.append((new['source_url'], imgUrl, imgName, imgPath))
+
+        # 插入mysql
+        db.saveData(table='news', values=[new[column] for column in DB.columns], source=source, entry=entry)
+
+    # 记录本次见到的最新新闻
+    @staticmethod
+    def seen(walk: dict, created: float, nid: str):
+        """
+        :param walk:    本次抓取的进度
+        :param created: 发布时间戳，没有时为None
+        :param nid:     文章id
+        :return:
+        """
+
+        if created is None:
+            return
+        if walk['newest'] is None or (created, str(nid)) > walk['newest']:
+            walk['newest'] = (created, str(nid))
+
+    # 站点已衔接上，记录本次完整抓取的进度
+    def finish(self, db, site: SITE, walk: dict):
+        """
+        :param db:      mysql对象
+        :param site:    站点适配器
+        :param walk:    本次抓取的进度
+        :return:
+        """
+
+        fields = {'walk_cursor': None, 'last_pass': time.time()}
+
+        # 有新闻失败且未能加入重试队列时不推进衔接位置，避免下次在失败的新闻之前停止
+        if not walk['failed'] and walk['newest'] is not None:
+            fields.update(last_created=walk['newest'][0], last_nid=walk['newest'][1])
+
+        db.advance(site.source, **fields)
+
+
+# 历史回填
+class BACKFILL(object):
+    """
+    把站点的翻页范围切成多个分段，多线程并发回填，每页处理完后与该页新闻在同一事务中记录进度
+    中断后重新执行只处理未完成的分段，并从分段内中断的页继续
+    """
+
+    # 日志前缀
+    prefix = '[ BACKFILL ]'
+
+    def __init__(self, *sites: SITE, pages: int = None, chunk: int = None, workers: int = None):
+
+        # 需要回填的站点
+        self.sites = list(sites)
+        # 每个站点回填的页数
+        self.pages = pages or CONFIG.get('backfillPages')
+        # 每个分段的页数
+        self.chunk = chunk or CONFIG.get('backfillChunk')
+        # 同时处理的分段数
+        self.workers = workers or CONFIG.get('backfillWorkers')
+
+    # 分段标识
+    @staticmethod
+    def key(site: SITE, first: int, last: int):
+        """
+        :param site:    站点适配器
+        :param first:   分段起始页
+        :param last:    分段结束页（包含）
+        :return:
+        """
+        return '%s/%d-%d' % (site.source, first, last)
+
+    # 生成站点未完成的分段，已有分段沿用记录中的范围
+    def plan(self, db, site: SITE):
+        """
+        :param db:      mysql对象
+        :param site:    站点适配器
+        :return:        [(起始页, 结束页, 继续处理的页)]
+        """
+
+        pending, covered = [], 0
+        for source, cursor, lastPass in db.partitions(source=site.source):
+            first, last = [int(page) for page in source.split('/')[-1].split('-')]
+            covered = max(covered, last + 1)
+            if lastPass is None:
+                pending.append((first, last, int(cursor) if cursor else first))
+
+        # 回填页数超过已有分段时追加新分段
+        for first in range(covered, self.pages, self.chunk):
+            last = min(first + self.chunk, self.pages) - 1
+            db.advance(self.key(site, first, last), walk_cursor=str(first))
+            pending.append((first, last, first))
+        db.flush()
+
+        return sorted(pending)
+
+    # 回填一个分段
+    def fill(self, site: SITE, first: int, last: int, start: int):
+        """
+        :param site:    站点适配器
+        :param first:   分段起始页
+        :param last:    分段结束页（包含）
+        :param start:   从哪一页继续
+        :return:        提交写入的新闻条数
+        """
+
+        # 异常退出时同样归还连接
+        with DB() as db:
+            return self.fillPages(db=db, site=site, first=first, last=last, start=start)
+
+    # 逐页回填一个分段
+    def fillPages(self, db, site: SITE, first: int, last: int, start: int):
+        """
+        :param db:      mysql对象
+        :param site:    站点适配器
+        :param first:   分段起始页
+        :param last:    分段结束页（包含）
+        :param start:   从哪一页继续
+        :return:        提交写入的新闻条数
+        """
+
+        key = self.key(site, first, last)
+        saved = 0
+        # 第一个抓取失败新闻所在的页，分段结束后从这里重新处理
+        retry = None
+
+        # 多处理一页，覆盖回填期间新发布的新闻把条目推到下一分段的情况
+        for page in range(start, last + 2):
+
+            try:
+                entries = site.getNeswIndex(page=page, cached=False)
+            except Exception as e:
+                LOG(prefix=site.prefix, msg='[ %s ] 第 [ %d ] 页列表获取失败，分段中断: %s' % (key, page + 1, e))
+                retry = page if retry is None else retry
+                break
+
+            # 已经到最后一页；只按未过滤的列表判断，整页都被过滤（如整页英文）时继续往后翻
+            if not entries:
+                break
+            entries = [entry for entry in entries if site.accept(entry)]
+
+            # 已存储的不再请求详情页
+            unknown = DEDUP.unknown(db=db, urls=[entry['source_url'] for entry in entries])
+            pending = [entry for entry in entries if entry['source_url'] in unknown]
+            details = FETCHER(deadline=CONFIG.get('articleDeadline'), hedge=CONFIG.get('hedge')).gather([
+                (entry['source_url'], site.getNewsDetails, {'entry': entry}) for entry in pending
+            ])
+
+            images = []
+            for entry, new in zip(pending, details):
+                if isinstance(new, Exception):
+                    LOG(prefix=site.prefix, msg="文章 [ %s ] 详情抓取失败，已加入重试队列: %s"
+                                                % (entry['source_url'], new))
+                    if not db.deadLetter(sourceUrl=entry['source_url'], kind='news', source=site.source,
+                                         entry=entry, error=new):
+                        retry = page if retry is None else retry
+                    continue
+                PIPELINE.store(db=db, new=new, images=images, source=site.source, entry=entry)
+                saved += 1
+
+            # 进度与本页新闻一起写入
+            db.advance(key, walk_cursor=str(page + 1))
+            db.flush()
+            for image in images:
+                IMAGES.submit(*image)
+
+            # 有新闻未能写入也未能加入重试队列，下次从本页重新处理
+            lost, db.lost = db.lost, set()
+            if lost:
+                retry = page if retry is None else retry
+
+        # 列表失败或新闻未能加入重试队列时保留进度，下次从第一个失败的页重新处理（已存储的新闻会被跳过）
+        if retry is not None:
+            db.advance(key, walk_cursor=str(retry))
+            LOG(prefix=site.prefix, msg='[ %s ] 未全部完成，下次从第 [ %d ] 页继续' % (key, retry + 1))
+        else:
+            db.advance(key, walk_cursor=None, last_pass=time.time())
+            LOG(prefix=site.prefix, msg='[ %s ] 回填完成，写入 [ %d ] 条' % (key, saved))
+
+        return saved
+
+    # 执行回填
+    def run(self):
+        """
+        :return:
+        """
+
+        # 数据库迁移，所有站点未完成的分段，按页码交错排列，各站点同时推进
+        jobs = []
+        with DB() as db:
+            db.migrate()
+            for site in self.sites:
+                jobs += [(first, site, last, start) for first, last, start in self.plan(db=db, site=site)]
+        jobs.sort(key=lambda job: job[0])
+
+        LOG(prefix=self.prefix, msg='未完成的分段 [ %d ] 个，并发 [ %d ]' % (len(jobs), self.workers))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.fill, site, first, last, start) for first, site, last, start in jobs]
+            saved = sum(future.result() for future in futures)
+
+        LOG(prefix=self.prefix, msg='回填结束，共写入 [ %d ] 条' % saved)
+
+
+# 失败重试
+class RETRY(object):
+    """
+    定时取出到期的失败记录重新处理：新闻重新抓取详情入库，图片交给后台下载
+    成功后删除记录，再次失败时次数加一并按指数退避推迟
+    """
+
+    # 日志前缀
+    prefix = '[ RETRY ]'
+
+    # 执行一次重试
+    def run(self):
+        """
+        :return:
+        """
+
+        # 异常退出时同样归还连接
+        with DB() as db:
+            self.redrive(db=db)
+
+    # 重新处理到期的记录
+    def redrive(self, db):
+        """
+        :param db:      mysql对象
+        :return:
+        """
+
+        # 只取本程序的站点和图片记录，COLLECT 的记录由 runNews-flask.py 处理
+        sites = {cls.__name__: cls() for cls in SITE.registry}
+        rows = db.dueRetries(sources=list(sites) + ['IMAGES'], limit=CONFIG.get('retryBatch'))
+        if not rows:
+            return
+
+        # 图片交给后台下载，结果由下载线程记录
+        for sourceUrl, kind, source, entry in rows:
+            if kind == 'img':
+                IMAGES.submit(sourceUrl, entry['url'], entry['fileName'], entry['imgPath'])
+
+        # 已经由后续抓取写入的新闻直接删除记录，站点已下线的不再重试
+        news = [(sourceUrl, source, entry) for sourceUrl, kind, source, entry in rows if kind == 'news']
+        unknown = DEDUP.unknown(db=db, urls=[sourceUrl for sourceUrl, source, entry in news])
+        for sourceUrl, source, entry in news:
+            if sourceUrl not in unknown or source not in sites:
+                db.clearRetry(sourceUrl=sourceUrl, kind='news')
+        news = [item for item in news if item[0] in unknown and item[1] in sites]
+
+        # 并发重新抓取详情
+        details = FETCHER(deadline=CONFIG.get('articleDeadline'), hedge=CONFIG.get('hedge')).gather([
+            (sourceUrl, sites[source].getNewsDetails, {'entry': entry}) for sourceUrl, source, entry in news
+        ])
+
+        images, done = [], []
+        for (sourceUrl, source, entry), new in zip(news, details):
+            if isinstance(new, Exception):
+                db.deadLetter(sourceUrl=sourceUrl, kind='news', source=source, entry=entry, error=new)
+                continue
+            PIPELINE.store(db=db, new=new, images=images, source=source, entry=entry)
+            done.append(sourceUrl)
+
+        # 确认写入之后再删除记录，写入失败的下次仍会重试
+        db.flush()
+        for sourceUrl in db.existsUrls(urls=done):
+            db.clearRetry(sourceUrl=sourceUrl, kind='news')
+        for image in images:
+            IMAGES.submit(*image)
+
+        LOG(prefix=self.prefix, msg='重试 [ %d ] 条，成功 [ %d ] 条' % (len(rows), len(done)))
+
+
+# 抓取调度
+class SPIDER(object):
+    """
+    单进程调度所有站点：每个站点一个定时任务，在线程池中并发执行
+    同一站点同时只运行一个实例，错过的触发合并为一次，触发时间加随机抖动
+    """
+
+    # 日志前缀
+    prefix = '[ SPIDER ]'
+
+    # 站点的触发器
+    def trigger(self, site: SITE):
+        """
+        :param site:    站点适配器
+        :return:
+        """
+
+        if site.interval:
+            return IntervalTrigger(seconds=site.interval, jitter=CONFIG.get('jitter'))
+
+        # 与 CronTrigger.from_crontab 相同的字段顺序，额外支持抖动
+        minute, hour, day, month, dayOfWeek = (site.cron or CONFIG.get('cron')).split()
+        return CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=dayOfWeek,
+                           jitter=CONFIG.get('jitter'))
+
+    # 启动调度
+    def run(self):
+        """
+        :return:
+        """
+
+        # 数据库迁移
+        with DB() as db:
+            db.migrate()
+
+        # 定时任务
+        sched = BlockingScheduler(
+            executors={'default': JobExecutor(CONFIG.get('siteWorkers'))},
+            job_defaults={
+                # 同一站点不重叠执行
+                'max_instances': 1,
+                # 错过的多次触发只补跑一次
+                'coalesce': True,
+                'misfire_grace_time': CONFIG.get('misfireGrace'),
+            },
+        )
+
+        # 每个站点一个任务，慢站点不影响其他站点
+        for cls in SITE.registry:
+            site = cls()
+            sched.add_job(site.spider, self.trigger(site), id=cls.__name__, name=cls.__name__,
+                          next_run_time=datetime.datetime.now())
+            LOG(prefix=self.prefix, msg='[ %s ] 已加入调度: %s' % (cls.__name__, site.interval or site.cron
+                                                                 or CONFIG.get('cron')))
+
+        # 失败重试
+        retry = IntervalTrigger(seconds=CONFIG.get('retryInterval'), jitter=CONFIG.get('jitter'))
+        sched.add_job(RETRY().run, retry, id='RETRY', name='RETRY')
+
+        sched.start()
 
 
 if __name__ == '__main__':
-    SPIDER().run()
+
+    # 站点名称 -> 站点类
+    siteClasses = {cls.__name__: cls for cls in SITE.registry}
+
+    parser = argparse.ArgumentParser(description='新闻抓取')
+    sub = parser.add_subparsers(dest='command')
+    backfillParser = sub.add_parser('backfill', help='历史回填')
+    backfillParser.add_argument('sites', nargs='*', metavar='site',
+                                help='站点名称，默认全部站点，可选: %s' % ', '.join(siteClasses))
+    backfillParser.add_argument('--pages', type=int, default=CONFIG.get('backfillPages'), help='每个站点回填的页数')
+    backfillParser.add_argument('--chunk', type=int, default=CONFIG.get('backfillChunk'), help='每个分段的页数')
+    backfillParser.add_argument('--workers', type=int, default=CONFIG.get('backfillWorkers'), help='同时处理的分段数')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        # 站点名称只从已注册的站点中查找；nargs='*' 的位置参数设置 choices 时不传站点会报错，因此在这里校验
+        unknown = [name for name in args.sites if name not in siteClasses]
+        if unknown:
+            backfillParser.error('未知站点: %s，可选: %s' % (', '.join(unknown), ', '.join(siteClasses)))
+        names = args.sites or list(siteClasses)
+        BACKFILL(*[siteClasses[name]() for name in names], pages=args.pages, chunk=args.chunk,
+                 workers=args.workers).run()
+    else:
+        SPIDER().run()